@@ -0,0 +1,153 @@
+"""Arrow-backed frames, for the arrow=True option of the DataMapper
+constructors.
+
+Columns are pandas ArrowDtype columns over pyarrow arrays. Strings are
+kept in one contiguous buffer per column instead of a Python object per
+value, selecting columns and slicing rows share the buffers rather than
+copying them, and Parquet and Arrow IPC output take the arrays as they
+are. Needs pyarrow (pip install "wells[arrow]").
+"""
+
+import contextlib
+
+import pandas as pd
+
+try:
+    import pyarrow
+    import pyarrow.csv
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+
+def require():
+    if pyarrow is None:
+        raise ImportError(
+            'Arrow-backed frames need pyarrow: pip install "wells[arrow]"'
+        )
+
+
+def read_csv(path, usecols=None, nrows=None, chunksize=None, parse_dates=None):
+    """Read a CSV file with pyarrow's multi-threaded parser, taking the
+    pd.read_csv arguments FileScan passes. With chunksize it returns a
+    context manager iterating frames of chunksize rows, whose column types
+    are inferred from the start of the file."""
+    require()
+    options = pyarrow.csv.ConvertOptions(
+        include_columns=usecols,
+        column_types={c: pyarrow.timestamp("ns") for c in parse_dates or []},
+    )
+    if chunksize is not None:
+        return _chunks(path, options, chunksize)
+    if nrows == 0:
+        with pyarrow.csv.open_csv(path, convert_options=options) as reader:
+            return frame(reader.schema.empty_table())
+    table = pyarrow.csv.read_csv(path, convert_options=options)
+    if nrows is not None:
+        table = table.slice(0, nrows)
+    return frame(table)
+
+
+def frame(table, start=0):
+    """table as a frame of ArrowDtype columns, without copying."""
+    dataframe = table.to_pandas(types_mapper=pd.ArrowDtype)
+    dataframe.index = pd.RangeIndex(start, start + len(dataframe))
+    return dataframe
+
+
+def table(dataframe):
+    """dataframe's columns as a pyarrow Table, leaving out the index;
+    ArrowDtype columns are not copied."""
+    require()
+    return pyarrow.Table.from_pandas(dataframe, preserve_index=False)
+
+
+def from_pandas(dataframe):
+    """dataframe with its columns converted to ArrowDtype. Columns pyarrow
+    can't represent, such as objects of mixed types, are left as they
+    are."""
+    require()
+    columns = {}
+    for name, column in dataframe.items():
+        if not isinstance(column.dtype, pd.ArrowDtype):
+            try:
+                array = pyarrow.array(column, from_pandas=True)
+            except (pyarrow.ArrowInvalid, pyarrow.ArrowTypeError):
+                pass
+            else:
+                column = pd.Series(
+                    pd.arrays.ArrowExtensionArray(array),
+                    index=column.index,
+                    name=name,
+                )
+        columns[name] = column
+    if not columns:
+        return dataframe
+    return pd.DataFrame(columns, index=dataframe.index, copy=False)
+
+
+def write_parquet(chunks, path, compression="snappy"):
+    """Write frames to one Parquet file, a row group per frame."""
+    require()
+    _write(
+        chunks,
+        lambda schema: pyarrow.parquet.ParquetWriter(
+            path, schema, compression=compression
+        ),
+    )
+
+
+def write_ipc(chunks, path, compression=None):
+    """Write frames to one Arrow IPC (Feather v2) file, which can be
+    memory-mapped back; compression is None, "lz4" or "zstd"."""
+    require()
+    options = pyarrow.ipc.IpcWriteOptions(compression=compression)
+    _write(
+        chunks,
+        lambda schema: pyarrow.ipc.new_file(path, schema, options=options),
+    )
+
+
+def _write(chunks, open_writer):
+    # the first frame fixes the schema; later ones are cast to it, so a
+    # column that was all missing in one chunk doesn't change type
+    writer = schema = None
+    try:
+        for chunk in chunks:
+            data = table(chunk)
+            if writer is None:
+                schema = data.schema
+                writer = open_writer(schema)
+            elif data.schema != schema:
+                data = data.cast(schema)
+            writer.write_table(data)
+        if writer is None:
+            writer = open_writer(pyarrow.schema([]))
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+@contextlib.contextmanager
+def _chunks(path, options, chunksize):
+    with pyarrow.csv.open_csv(path, convert_options=options) as reader:
+        yield _frames(reader, chunksize)
+
+
+def _frames(reader, chunksize):
+    pending, rows, start = [], 0, 0
+    for batch in reader:
+        pending.append(batch)
+        rows += batch.num_rows
+        if rows < chunksize:
+            continue
+        data = pyarrow.Table.from_batches(pending, reader.schema)
+        full = rows - rows % chunksize
+        for offset in range(0, full, chunksize):
+            yield frame(data.slice(offset, chunksize), start)
+            start += chunksize
+        pending = data.slice(full).to_batches()
+        rows -= full
+    if rows:
+        yield frame(pyarrow.Table.from_batches(pending, reader.schema), start)
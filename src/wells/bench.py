@@ -0,0 +1,329 @@
+"""Benchmarks for DataMapper operations on synthetic production data.
+
+    python -m wells.bench --sizes 1e4 1e6 --output bench.json
+    python -m wells.bench --sizes 1e4 --compare bench.json
+
+Each case is timed (best of --repeat runs) and, in a separate run, its
+peak traced allocation is measured with tracemalloc. With --compare the
+results are checked against a stored run and cases slower or bigger than
+--tolerance allows are reported as regressions (exit status 1).
+"""
+
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from wells.dsl import DataMapper
+from wells.ref_data import SqliteLookup
+
+LOCATIONS = ["Permian", "Bakken", "Eagle Ford", "Marcellus", "Haynesville"]
+PRODUCTS = ["oil", "gas", "ngl", "condensate"]
+METRICS = ["Daily Rate", "Volume", "Realised Price", "Revenue", "Taxes"]
+PORTS = ["USHOU", "USMSY", "USCRP", "USBPT", "USLCH", "USNYC"]
+MONTHS = 12
+
+# row-wise add_column is too slow to run on the biggest datasets
+ROW_WISE_LIMIT = 10**6
+
+
+def production_data(rows, seed=0):
+    """Monthly production rows, one per (property_id, month)."""
+    rng = np.random.default_rng(seed)
+    index = np.arange(rows)
+    months = pd.date_range("2022-01-01", periods=MONTHS, freq="MS")
+    return pd.DataFrame(
+        {
+            "property_id": index // MONTHS,
+            "month": months[index % MONTHS],
+            "location": rng.choice(LOCATIONS, rows),
+            "product_type": rng.choice(PRODUCTS, rows),
+            "metric_name": rng.choice(METRICS, rows),
+            "port": rng.choice(PORTS, rows),
+            "wells": rng.integers(1, 60, rows),
+            "volume": rng.gamma(2.0, 500.0, rows).round(2),
+            "realised_price": rng.normal(70.0, 8.0, rows).round(2),
+        }
+    )
+
+
+def cases(directory):
+    """(name, setup, run, max_rows) for every benchmarked operation.
+
+    setup(df) returns what run() takes, so preparing inputs isn't timed.
+    """
+    lookup_path = os.path.join(directory, "helo_ref.db")
+    _reference_db(lookup_path)
+    ports = {code: f"Port {code}" for code in PORTS}
+
+    def mapper(df):
+        return DataMapper(df.copy())
+
+    def chain(m):
+        return (
+            m.rename_columns({"realised_price": "price"})
+            .filter_columns(["location", "volume", "price", "wells"])
+            .filter_rows("volume > 100")
+            .add_column("revenue", "volume * price")
+            .drop_columns(["price"])
+            .group_by(by="location", agg_func="sum")
+            .sort_rows(by="revenue", ascending=False)
+        )
+
+    count = 10**6 // MONTHS
+    properties = pd.DataFrame(
+        {
+            "property_id": np.arange(count),
+            "operator": [f"Operator {i % 500}" for i in range(count)],
+            "spud_year": 1990 + np.arange(count) % 35,
+        }
+    )
+
+    def sql_target():
+        return f"sqlite:///{os.path.join(directory, 'bench.db')}"
+
+    return [
+        (
+            "filter_rows",
+            mapper,
+            lambda m: m.filter_rows("volume > 1000"),
+            None,
+        ),
+        (
+            "change_values_conditionally",
+            mapper,
+            lambda m: m.change_values_conditionally(
+                "volume", "wells > 30 & product_type == 'oil'", "volume * 2"
+            ),
+            None,
+        ),
+        (
+            "add_column_expression",
+            mapper,
+            lambda m: m.add_column("revenue", "volume * realised_price"),
+            None,
+        ),
+        (
+            "add_column_vectorized",
+            mapper,
+            lambda m: m.add_column(
+                "revenue",
+                lambda df: df["volume"] * df["realised_price"],
+                vectorized=True,
+            ),
+            None,
+        ),
+        (
+            "add_column_rowwise",
+            mapper,
+            lambda m: m.add_column(
+                "revenue", lambda row: row["volume"] * row["realised_price"]
+            ),
+            ROW_WISE_LIMIT,
+        ),
+        (
+            "group_by",
+            mapper,
+            lambda m: m.group_by(
+                ["location", "product_type"],
+                {"volume": "sum", "realised_price": "mean"},
+            ),
+            None,
+        ),
+        (
+            "pivot",
+            mapper,
+            lambda m: m.pivot(
+                index="property_id", columns="month", values="volume"
+            ),
+            None,
+        ),
+        (
+            "lookup_value_dict",
+            mapper,
+            lambda m: m.lookup_value("port", ports),
+            None,
+        ),
+        (
+            "lookup_value_sqlite",
+            mapper,
+            lambda m: m.lookup_value(
+                "port", SqliteLookup(lookup_path), "UNLOC"
+            ),
+            None,
+        ),
+        (
+            "join",
+            mapper,
+            lambda m: m.join(properties, on="property_id"),
+            None,
+        ),
+        (
+            "to_sql",
+            mapper,
+            lambda m: m.to_sql("production", sql_target()),
+            None,
+        ),
+        (
+            "to_json",
+            mapper,
+            lambda m: m.to_json(os.path.join(directory, "bench.json")),
+            None,
+        ),
+        ("chain_eager", mapper, lambda m: chain(m).df, None),
+        (
+            "chain_lazy",
+            lambda df: DataMapper(df.copy(), lazy=True),
+            lambda m: chain(m).collect(),
+            None,
+        ),
+    ]
+
+
+def run(sizes, repeat=3, only=None, memory=True):
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        suite = cases(directory)
+        for rows in sizes:
+            df = production_data(rows)
+            for name, setup, case, max_rows in suite:
+                if only and name not in only:
+                    continue
+                if max_rows is not None and rows > max_rows:
+                    continue
+                result = {"case": name, "rows": rows}
+                result["seconds"] = _best_time(df, setup, case, repeat)
+                if memory:
+                    result["peak_bytes"] = _peak_memory(df, setup, case)
+                results.append(result)
+                print(_describe(result), file=sys.stderr)
+    return {"meta": _meta(repeat), "results": results}
+
+
+def compare(current, baseline, tolerance=0.25):
+    """Cases in current more than tolerance slower or bigger than baseline."""
+    stored = {(r["case"], r["rows"]): r for r in baseline["results"]}
+    regressions = []
+    for result in current["results"]:
+        before = stored.get((result["case"], result["rows"]))
+        if before is None:
+            continue
+        for metric in ("seconds", "peak_bytes"):
+            if metric not in result or not before.get(metric):
+                continue
+            ratio = result[metric] / before[metric]
+            if ratio > 1 + tolerance:
+                regressions.append(
+                    {
+                        "case": result["case"],
+                        "rows": result["rows"],
+                        "metric": metric,
+                        "baseline": before[metric],
+                        "current": result[metric],
+                        "ratio": ratio,
+                    }
+                )
+    return regressions
+
+
+def _best_time(df, setup, case, repeat):
+    best = None
+    for _ in range(repeat):
+        subject = setup(df)
+        start = time.perf_counter()
+        case(subject)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def _peak_memory(df, setup, case):
+    subject = setup(df)
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        case(subject)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak
+
+
+def _reference_db(path):
+    con = sqlite3.connect(path)
+    con.execute("CREATE TABLE helo_ref (type TEXT, code TEXT, value TEXT)")
+    con.executemany(
+        "INSERT INTO helo_ref VALUES ('UNLOC', ?, ?)",
+        [(code, f"Port {code}") for code in PORTS],
+    )
+    con.commit()
+    con.close()
+
+
+def _meta(repeat):
+    return {
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "repeat": repeat,
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def _describe(result):
+    text = f"{result['case']:<24} {result['rows']:>10} rows"
+    text += f" {result['seconds']:>9.4f} s"
+    if "peak_bytes" in result:
+        text += f" {result['peak_bytes'] / 2**20:>9.1f} MiB"
+    return text
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m wells.bench")
+    parser.add_argument(
+        "--sizes", nargs="+", default=["1e4", "1e6", "1e7"], type=float
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--case", action="append", dest="only")
+    parser.add_argument("--no-memory", action="store_false", dest="memory")
+    parser.add_argument("--output")
+    parser.add_argument("--compare")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args(argv)
+
+    current = run(
+        [int(size) for size in args.sizes], args.repeat, args.only, args.memory
+    )
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(current, output, indent=2)
+    else:
+        json.dump(current, sys.stdout, indent=2)
+        print()
+    if args.compare:
+        with open(args.compare) as stored:
+            regressions = compare(current, json.load(stored), args.tolerance)
+        for r in regressions:
+            print(
+                f"REGRESSION {r['case']} at {r['rows']} rows: {r['metric']} "
+                f"{r['baseline']:.4g} -> {r['current']:.4g} "
+                f"({r['ratio']:.2f}x)",
+                file=sys.stderr,
+            )
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,322 @@
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+# numpy kinds stored as raw .npy columns and memory-mapped back
+MAPPABLE = "biufcmM"
+
+
+def save_frame(dataframe, directory):
+    """Write dataframe to directory as one file per column.
+
+    Numeric, bool and datetime columns are plain .npy files, object columns
+    are stored as integer codes plus their distinct values, and anything
+    else is pickled. Frames with non-JSON column names or a MultiIndex are
+    pickled whole.
+    """
+    os.makedirs(directory, exist_ok=True)
+    names = _jsonable(list(dataframe.columns))
+    index = dataframe.index
+    if names is None or isinstance(index, pd.MultiIndex):
+        with open(os.path.join(directory, "frame.pkl"), "wb") as f:
+            pickle.dump(dataframe, f, pickle.HIGHEST_PROTOCOL)
+        meta = {"names": None}
+    else:
+        columns = [
+            _save_column(dataframe.iloc[:, i], directory, f"c{i}")
+            for i in range(len(names))
+        ]
+        if isinstance(index, pd.RangeIndex):
+            index_meta = {"range": [index.start, index.stop, index.step]}
+        else:
+            index_meta = _save_column(index.to_series(), directory, "index")
+        meta = {"names": names, "columns": columns, "index": index_meta}
+    with open(os.path.join(directory, "meta.json"), "w") as meta_file:
+        json.dump(meta, meta_file)
+
+
+def load_frame(directory):
+    """Read a frame written by save_frame, memory-mapping what it can.
+
+    Mapped columns are copy-on-write, so changing them never touches the
+    files.
+    """
+    with open(os.path.join(directory, "meta.json")) as meta_file:
+        meta = json.load(meta_file)
+    names = meta["names"]
+    if names is None:
+        with open(os.path.join(directory, "frame.pkl"), "rb") as f:
+            return pickle.load(f)
+    data = {
+        i: _load_column(directory, column)
+        for i, column in enumerate(meta["columns"])
+    }
+    if "range" in meta["index"]:
+        index = pd.RangeIndex(*meta["index"]["range"])
+    else:
+        index = pd.Index(_load_column(directory, meta["index"]))
+    dataframe = pd.DataFrame(data, index=index, copy=False)
+    dataframe.columns = names
+    return dataframe
+
+
+def _jsonable(names):
+    try:
+        if json.loads(json.dumps(names)) == names:
+            return names
+    except TypeError:
+        pass
+    return None
+
+
+def _save_column(series, directory, stem):
+    dtype = series.dtype
+    if isinstance(dtype, np.dtype) and dtype.kind in MAPPABLE:
+        np.save(os.path.join(directory, f"{stem}.npy"), series.to_numpy())
+        return {"file": f"{stem}.npy", "kind": "array"}
+    if dtype == object:
+        try:
+            codes, uniques = pd.factorize(series.to_numpy())
+        except TypeError:
+            codes = None
+        if codes is not None:
+            np.save(os.path.join(directory, f"{stem}.npy"), codes)
+            with open(os.path.join(directory, f"{stem}.pkl"), "wb") as f:
+                pickle.dump(list(uniques), f, pickle.HIGHEST_PROTOCOL)
+            return {"file": f"{stem}.npy", "kind": "codes"}
+    with open(os.path.join(directory, f"{stem}.pkl"), "wb") as f:
+        pickle.dump(series.array, f, pickle.HIGHEST_PROTOCOL)
+    return {"file": f"{stem}.pkl", "kind": "pickle"}
+
+
+def _load_column(directory, column):
+    path = os.path.join(directory, column["file"])
+    if column["kind"] == "array":
+        return np.load(path, mmap_mode="c").view(np.ndarray)
+    if column["kind"] == "pickle":
+        with open(path, "rb") as f:
+            return pickle.load(f)
+    codes = np.load(path)
+    with open(path[: -len(".npy")] + ".pkl", "rb") as f:
+        uniques = np.array(pickle.load(f) + [np.nan], dtype=object)
+    return uniques[codes]
+
+
+class DiskCache:
+    """Frames on disk under string keys, with LRU eviction past max_bytes.
+
+    Every entry is a save_frame directory; reading an entry marks it as
+    recently used. With max_age set, entries stored more than max_age
+    seconds ago are dropped too.
+    """
+
+    def __init__(self, directory, max_bytes=2 * 1024**3, max_age=None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        os.makedirs(directory, exist_ok=True)
+
+    def get(self, key):
+        path = self._path(key)
+        if self._expired(path):
+            shutil.rmtree(path, ignore_errors=True)
+            return None
+        try:
+            dataframe = load_frame(path)
+        except (FileNotFoundError, NotADirectoryError):
+            return None
+        os.utime(os.path.join(path, "meta.json"))
+        return dataframe
+
+    def put(self, key, dataframe, **info):
+        """Store dataframe under key, with info kept for invalidate()."""
+        temporary = tempfile.mkdtemp(dir=self.directory, prefix=".tmp-")
+        try:
+            save_frame(dataframe, temporary)
+            with open(os.path.join(temporary, "info.json"), "w") as f:
+                json.dump(info, f)
+            path = self._path(key)
+            shutil.rmtree(path, ignore_errors=True)
+            os.replace(temporary, path)
+        finally:
+            shutil.rmtree(temporary, ignore_errors=True)
+        self.evict()
+
+    def invalidate(self, **info):
+        """Remove the entries whose info matches, or every entry."""
+        for key in self._keys():
+            if info and not self._matches(key, info):
+                continue
+            shutil.rmtree(self._path(key), ignore_errors=True)
+
+    def evict(self):
+        entries = []
+        for key in self._keys():
+            path = self._path(key)
+            if self._expired(path):
+                shutil.rmtree(path, ignore_errors=True)
+                continue
+            try:
+                used = os.stat(os.path.join(path, "meta.json")).st_mtime_ns
+                size = sum(entry.stat().st_size for entry in os.scandir(path))
+            except FileNotFoundError:
+                continue
+            entries.append((used, size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+
+    def _expired(self, path):
+        if self.max_age is None:
+            return False
+        try:
+            stored = os.stat(path).st_mtime
+        except FileNotFoundError:
+            return False
+        return time.time() - stored > self.max_age
+
+    def _keys(self):
+        return [
+            name
+            for name in os.listdir(self.directory)
+            if not name.startswith(".")
+        ]
+
+    def _matches(self, key, info):
+        try:
+            with open(os.path.join(self._path(key), "info.json")) as f:
+                stored = json.load(f)
+        except FileNotFoundError:
+            return False
+        return all(stored.get(k) == v for k, v in info.items())
+
+    def _path(self, key):
+        return os.path.join(self.directory, key)
+
+
+class XlsxCache:
+    """Parsed workbook sheets cached by path, size, mtime and sheet name.
+
+    With hash_contents=True the file's SHA-256 is used instead of its
+    mtime, so touching a file without changing it keeps the entry.
+    """
+
+    _default = None
+
+    def __init__(
+        self, directory=None, max_bytes=2 * 1024**3, hash_contents=False
+    ):
+        if directory is None:
+            directory = os.path.join(default_directory(), "xlsx")
+        self.store = DiskCache(directory, max_bytes)
+        self.hash_contents = hash_contents
+
+    @classmethod
+    def default(cls):
+        """Shared cache under $WELLS_CACHE_DIR (~/.cache/wells by default)."""
+        if cls._default is None:
+            cls._default = cls()
+        return cls._default
+
+    def read_excel(
+        self,
+        path,
+        sheet_name="Sheet1",
+        usecols=None,
+        nrows=None,
+        parse_dates=None,
+        **kwargs,
+    ):
+        """pd.read_excel for one sheet, served from the cache when the file
+        hasn't changed. The whole sheet is cached; usecols, nrows and
+        parse_dates are applied to the cached frame. Other arguments are
+        part of the key, and ones that aren't plain data (converters, for
+        one) bypass the cache."""
+        if not _plain(kwargs):
+            return pd.read_excel(
+                path,
+                sheet_name=sheet_name,
+                usecols=usecols,
+                nrows=nrows,
+                parse_dates=parse_dates,
+                **kwargs,
+            )
+        key = self.key(path, sheet_name, **kwargs)
+        dataframe = self.store.get(key)
+        if dataframe is None:
+            dataframe = pd.read_excel(path, sheet_name=sheet_name, **kwargs)
+            self.store.put(
+                key,
+                dataframe,
+                path=os.path.abspath(path),
+                sheet_name=sheet_name,
+            )
+        if usecols is not None:
+            dataframe = dataframe[usecols]
+        if nrows is not None:
+            dataframe = dataframe.iloc[:nrows]
+        if parse_dates and (usecols is not None or nrows is not None):
+            # assigning to a slice would warn, and might write through it
+            dataframe = dataframe.copy()
+        for column in parse_dates or []:
+            dataframe[column] = pd.to_datetime(dataframe[column])
+        return dataframe
+
+    def key(self, path, sheet_name, **kwargs):
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        if self.hash_contents:
+            version = _file_hash(path)
+        else:
+            version = stat.st_mtime_ns
+        options = repr(sorted(kwargs.items()))
+        text = f"{path}\0{stat.st_size}\0{version}\0{sheet_name}\0{options}"
+        return hashlib.sha256(text.encode()).hexdigest()
+
+    def invalidate(self, path=None, sheet_name=None):
+        """Drop cached sheets of path (all of them if sheet_name is None),
+        or the whole cache if path is None."""
+        info = {}
+        if path is not None:
+            info["path"] = os.path.abspath(path)
+        if sheet_name is not None:
+            info["sheet_name"] = sheet_name
+        self.store.invalidate(**info)
+
+
+def default_directory():
+    return os.environ.get(
+        "WELLS_CACHE_DIR",
+        os.path.join(os.path.expanduser("~"), ".cache", "wells"),
+    )
+
+
+def _plain(value):
+    """Whether repr(value) is the same for equal values in every process."""
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return True
+    if isinstance(value, (type, np.dtype)):
+        return True
+    if isinstance(value, (list, tuple)):
+        return all(_plain(v) for v in value)
+    if isinstance(value, dict):
+        return all(_plain(k) and _plain(v) for k, v in value.items())
+    return False
+
+
+def _file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
@@ -1,87 +1,655 @@
+import glob
+import os
+import warnings
 import pandas as pd
-import json
-import uuid
-from sqlalchemy import create_engine
+
+from wells import arrow as arrow_
+from wells import expr
+from wells import incremental as incremental_
+from wells import join as join_
+from wells import loader
+from wells import parallel
+from wells import plan
+from wells import schema as schema_
+from wells import stream
+from wells import writers
+from wells.cache import XlsxCache
+from wells.plan import UnreadableFileWarning  # noqa: F401
+from wells.ref_data import Lookup
 
 DATA = "data"
 
+DEFAULT_CHUNKSIZE = 100_000
+
+
+class MissingCodesWarning(UserWarning):
+    def __init__(self, column_name, ref_type, codes):
+        self.column_name = column_name
+        self.ref_type = ref_type
+        self.codes = list(codes)
+        super().__init__(
+            f"{len(self.codes)} {ref_type} codes in {column_name!r} "
+            f"not found: {self.codes[:10]}"
+        )
+
 
 class DataMapper:
-    def __init__(self, dataframe):
-        self.df = dataframe
+    """Chainable DataFrame transformations.
+
+    With lazy=True each call is recorded as a plan step instead of running,
+    and the optimized plan only runs on collect(), to_sql() or to_json()
+    (or when .df is read).
+
+    With chunksize set the plan streams over the source chunksize rows at a
+    time, so to_sql() and to_json() never hold the whole dataset.
+    memory_limit (bytes, streaming DEFAULT_CHUNKSIZE rows at a time unless
+    chunksize is given) also bounds sort_rows and group_by, which spill to
+    temporary files past it. With workers set it runs over partitions in
+    that many processes. With memo, a memo.PipelineCache, every step's
+    result is cached and a re-run resumes after the deepest step whose
+    inputs haven't changed.
+
+    With trace, a trace.Trace, every step run in this process is recorded
+    with its timings, row and column counts and memory use.
+
+    Mappers built with incremental= read only the rows their source gained
+    since the last committed run (see wells.incremental); to_sql() then
+    appends by default, and it and the file writers commit the new
+    watermark once the rows are written.
+
+    The constructors' arrow=True keeps columns as pyarrow arrays (see
+    wells.arrow), which takes far less memory for string columns.
+    """
+
+    def __init__(
+        self,
+        dataframe,
+        lazy=False,
+        chunksize=None,
+        workers=None,
+        memo=None,
+        trace=None,
+        memory_limit=None,
+    ):
+        if memory_limit is not None and chunksize is None:
+            chunksize = DEFAULT_CHUNKSIZE
+        modes = [chunksize, workers, memo]
+        if sum(mode is not None for mode in modes) > 1:
+            raise ValueError("chunksize, workers and memo can't be combined")
+        self.lazy = lazy or any(mode is not None for mode in modes)
+        self.chunksize = chunksize
+        self.memory_limit = memory_limit
+        self.workers = workers
+        self.memo = memo
+        self.trace = trace
+        self.plan = []
+        self.memory_report = None
+        self.failures = []
+        self._tail = None
+        if isinstance(dataframe, (str, os.PathLike)):
+            if self.lazy:
+                self._scan = plan.FileScan(pd.read_csv, dataframe)
+                return
+            dataframe = pd.read_csv(dataframe)
+        self._scan = plan.FrameScan(dataframe)
+
+    @classmethod
+    def from_csv(
+        cls,
+        csv_file_path,
+        lazy=False,
+        chunksize=None,
+        workers=None,
+        schema=None,
+        optimize=False,
+        memo=None,
+        trace=None,
+        incremental=None,
+        memory_limit=None,
+        arrow=False,
+        wait_for_newline=False,
+    ):
+        """Read one CSV file, or a list of them with the same columns.
+
+        schema ({column: dtype}) reads only those columns, as those dtypes;
+        optimize=True shrinks the other columns (see schema.compact).
+        memory_report then holds the bytes before and after. incremental,
+        an incremental.Checkpoints (True for the default one), reads only
+        the rows appended to a single file since the last run; with
+        wait_for_newline=True it leaves a last line without its newline
+        for the next run. arrow=True parses with pyarrow into Arrow-backed
+        columns (see wells.arrow).
+        """
+        converter = schema_.Converter(schema, optimize, arrow=arrow)
+        kwargs = schema_.reader_kwargs(schema)
+        reader = arrow_.read_csv if arrow else pd.read_csv
+        if incremental:
+            checkpoints = _checkpoints(incremental)
+            scan = incremental_.CsvTail(
+                csv_file_path,
+                checkpoints,
+                converter,
+                wait_for_newline,
+                **kwargs,
+            )
+        elif isinstance(csv_file_path, (list, tuple)):
+            scan = plan.FilesScan.of(
+                reader, csv_file_path, converter, **kwargs
+            )
+        else:
+            scan = plan.FileScan(reader, csv_file_path, converter, **kwargs)
+        return cls._from_scan(
+            scan,
+            converter,
+            lazy=lazy,
+            chunksize=chunksize,
+            workers=workers,
+            memo=memo,
+            trace=trace,
+            memory_limit=memory_limit,
+        )
 
     @classmethod
-    def from_csv(cls, csv_file_path):
-        dataframe = pd.read_csv(csv_file_path)
-        return cls(dataframe)
+    def from_xlsx(
+        cls,
+        xlsx_file_path,
+        sheet_name="Sheet1",
+        lazy=False,
+        workers=None,
+        cache=True,
+        schema=None,
+        optimize=False,
+        memo=None,
+        trace=None,
+        incremental=None,
+        arrow=False,
+    ):
+        """Read one sheet. Parsed sheets are kept in cache, an XlsxCache
+        (XlsxCache.default() for True), and reused until the file changes;
+        cache=False always parses the workbook. schema, optimize,
+        incremental and arrow work as in from_csv, though an incremental
+        read still parses the whole sheet."""
+        converter = schema_.Converter(schema, optimize, arrow=arrow)
+        scan = _xlsx_scan(
+            xlsx_file_path,
+            sheet_name,
+            cache,
+            converter,
+            schema,
+            incremental and _checkpoints(incremental),
+        )
+        return cls._from_scan(
+            scan,
+            converter,
+            lazy=lazy,
+            workers=workers,
+            memo=memo,
+            trace=trace,
+        )
 
     @classmethod
-    def from_xlsx(cls, xlsx_file_path, sheet_name="Sheet1"):
-        dataframe = pd.read_excel(
-            xlsx_file_path, engine="openpyxl", sheet_name=sheet_name
+    def from_many(
+        cls,
+        paths,
+        sheet_name="Sheet1",
+        executor=None,
+        max_workers=None,
+        errors="raise",
+        source_column=None,
+        lazy=False,
+        workers=None,
+        cache=True,
+        schema=None,
+        optimize=False,
+        memo=None,
+        trace=None,
+        arrow=False,
+    ):
+        """Read many CSV and XLSX files, given as a glob pattern or a list
+        of paths, into one frame.
+
+        The files are parsed concurrently in a "thread" or "process" pool
+        of max_workers (the CPU count by default); executor=None picks
+        processes when there are workbooks, whose parsing holds the GIL,
+        and threads otherwise. errors="warn" or "ignore" skips files that
+        can't be read (listed in failures) instead of raising, and
+        source_column names a column to fill with each row's file path.
+        The rest work as in from_csv and from_xlsx.
+        """
+        if isinstance(paths, (str, os.PathLike)):
+            paths = sorted(glob.glob(os.fspath(paths)))
+        if not paths:
+            raise FileNotFoundError("from_many got no files")
+        converter = schema_.Converter(schema, optimize, arrow=arrow)
+        scans = []
+        for path in paths:
+            if _is_xlsx(path):
+                scan = _xlsx_scan(path, sheet_name, cache, converter, schema)
+            else:
+                scan = plan.FileScan(
+                    arrow_.read_csv if arrow else pd.read_csv,
+                    path,
+                    converter,
+                    **schema_.reader_kwargs(schema),
+                )
+            scans.append(scan)
+        if executor is None:
+            executor = "process" if any(map(_is_xlsx, paths)) else "thread"
+        scan = plan.FilesScan(
+            scans, executor, max_workers, errors, source_column
         )
-        return cls(dataframe)
+        mapper = cls._from_scan(
+            scan,
+            converter,
+            lazy=lazy,
+            workers=workers,
+            memo=memo,
+            trace=trace,
+        )
+        mapper.failures = scan.failures
+        return mapper
+
+    @classmethod
+    def from_table(
+        cls,
+        table_name,
+        connection_string,
+        key=None,
+        incremental=None,
+        lazy=False,
+        chunksize=None,
+        workers=None,
+        schema=None,
+        optimize=False,
+        memo=None,
+        trace=None,
+        memory_limit=None,
+        arrow=False,
+    ):
+        """Read a database table; a bare path is a SQLite database.
+
+        With incremental (as in from_csv) only the rows whose key column
+        is above the largest key of the last committed run are read, so
+        key has to only grow, like an autoincrement id. schema, optimize
+        and arrow work as in from_csv.
+        """
+        converter = schema_.Converter(schema, optimize, arrow=arrow)
+        if incremental:
+            if key is None:
+                raise ValueError("incremental from_table needs a key")
+            scan = incremental_.TableTail(
+                table_name,
+                connection_string,
+                key,
+                _checkpoints(incremental),
+                converter,
+            )
+        else:
+            scan = plan.TableScan(table_name, connection_string, converter)
+        return cls._from_scan(
+            scan,
+            converter,
+            lazy=lazy,
+            chunksize=chunksize,
+            workers=workers,
+            memo=memo,
+            trace=trace,
+            memory_limit=memory_limit,
+        )
+
+    @classmethod
+    def _from_scan(cls, scan, converter=None, **options):
+        mapper = cls(None, **options)
+        mapper._scan = scan
+        if isinstance(scan, incremental_.Tail):
+            if mapper.memo is not None:
+                raise ValueError("incremental runs can't use memo")
+            mapper._tail = scan
+        if converter is not None and (
+            converter.schema or converter.optimize or converter.arrow
+        ):
+            mapper.memory_report = converter.report
+        if not mapper.lazy:
+            mapper.df = mapper._traced(
+                "scan", {"source": _source(scan)}, scan.read
+            )
+        return mapper
+
+    @property
+    def df(self):
+        if self.plan or not isinstance(self._scan, plan.FrameScan):
+            self.collect()
+        return self._scan.dataframe
+
+    @df.setter
+    def df(self, dataframe):
+        self._scan = plan.FrameScan(dataframe)
+        self.plan = []
+
+    def collect(self):
+        if self.chunksize is not None:
+            dataframe = pd.concat(list(self._chunks()))
+        elif self.workers is not None:
+            scan_columns, steps = self._optimized()
+            steps = _indexed(steps)
+            parts = self._scan.partitions(scan_columns, self.workers)
+            dataframe = self._traced(
+                "parallel",
+                {"workers": self.workers, "steps": steps},
+                lambda: parallel.execute(
+                    parts,
+                    steps,
+                    _replay,
+                    self.workers,
+                    self._scan.ignore_index,
+                ),
+            )
+        elif self.memo is not None:
+            scan_columns, steps = self._optimized()
+            dataframe = self.memo.run(
+                self._scan, scan_columns, steps, self._run
+            )
+        else:
+            scan_columns, steps = self._optimized()
+            dataframe = self._traced(
+                "scan",
+                {"source": _source(self._scan), "columns": scan_columns},
+                lambda: self._scan.read(scan_columns),
+            )
+            dataframe = self._run(dataframe, steps)
+        self.df = dataframe
+        return self.df
 
+    def _chunks(self):
+        if self.chunksize is None:
+            yield self.df
+            return
+        scan_columns, steps = self._optimized()
+        steps = _indexed(steps)
+        chunks = self._scan.chunks(scan_columns, self.chunksize)
+        yield from stream.execute(chunks, steps, self._run, self.memory_limit)
+
+    def _run(self, dataframe, steps):
+        return _replay(dataframe, steps, self.trace)
+
+    def explain(self):
+        scan_columns, steps = self._optimized()
+        return plan.explain(self._scan, scan_columns, steps)
+
+    def _traced(self, name, args, call):
+        if self.trace is None:
+            return call()
+        return self.trace.record(name, args, None, call)
+
+    def _optimized(self):
+        if not self.plan:
+            return None, []
+        return plan.optimize(self.plan, self._scan.columns)
+
+    @plan.step
     def rename_columns(self, columns_mapping):
         self.df.rename(columns=columns_mapping, inplace=True)
         return self
 
+    @plan.step
     def filter_columns(self, columns):
         self.df = self.df[columns]
         return self
 
+    @plan.step
     def filter_rows(self, condition):
-        self.df = self.df.query(condition)
+        """Keep the rows where condition, a DataFrame.query string, holds.
+        Conditions are compiled once and reused (see expr)."""
+        self.df = self.df.loc[expr.mask(self.df, condition)]
         return self
 
-    def add_column(self, column_name, function):
-        self.df[column_name] = self.df.apply(function, axis=1)
+    @plan.step
+    def add_column(self, column_name, function, vectorized=False):
+        """Set column_name from function.
+
+        function is an expression string evaluated column-wise
+        ("volume * realised_price"), a callable that gets the whole frame
+        when vectorized=True, or a callable that gets one row at a time.
+        Vectorized callables must work element by element.
+        """
+        if isinstance(function, str):
+            self.df[column_name] = expr.evaluate(self.df, function)
+        elif vectorized:
+            self.df[column_name] = function(self.df)
+        else:
+            self.df[column_name] = self.df.apply(function, axis=1)
         return self
 
+    @plan.step
     def drop_columns(self, columns):
         self.df.drop(columns=columns, inplace=True)
         return self
 
+    @plan.step
     def sort_rows(self, by, ascending=True):
-        self.df.sort_values(by=by, ascending=ascending, inplace=True)
+        self.df.sort_values(
+            by=by, ascending=ascending, inplace=True, kind="stable"
+        )
         return self
 
+    @plan.step
     def group_by(self, by, agg_func):
-        self.df = self.df.groupby(by).agg(agg_func).reset_index()
+        grouped = self.df.groupby(by, observed=True)
+        self.df = grouped.agg(agg_func).reset_index()
         return self
 
+    @plan.step
     def fill_missing(self, column, value):
+        schema_.allow(self.df, column, [value])
         self.df[column] = self.df[column].fillna(value)
         return self
 
-    def lookup_value(self, column_name, lookup_dict):
-        self.df[column_name] = self.df[column_name].map(lookup_dict)
+    @plan.step
+    def lookup_value(self, column_name, lookup_dict, ref_type=None):
+        """Map column_name through lookup_dict, a dict or a ref_data.Lookup.
+
+        A Lookup resolves the column's distinct codes as (ref_type, code)
+        pairs in one get_values call; codes it can't find become NaN and
+        are reported with a MissingCodesWarning.
+        """
+        column = self.df[column_name]
+        if isinstance(lookup_dict, Lookup):
+            if ref_type is None:
+                raise ValueError("lookup_value with a Lookup needs ref_type")
+            codes = column.dropna().unique()
+            found = lookup_dict.get_values((ref_type, c) for c in codes)
+            mapping = {code: value for (_, code), value in found.items()}
+            missing = [c for c in codes if c not in mapping]
+            if missing:
+                warnings.warn(
+                    MissingCodesWarning(column_name, ref_type, missing)
+                )
+            lookup_dict = mapping
+        self.df[column_name] = column.map(lookup_dict)
         return self
 
-    def change_values(self, column_name, function):
-        self.df[column_name] = self.df[column_name].apply(function)
+    @plan.step
+    def change_values(self, column_name, function, vectorized=False):
+        """Replace column_name using function, in the forms add_column takes,
+        except that a vectorized callable gets the column rather than the
+        frame and a row-wise callable gets one value at a time.
+        """
+        if isinstance(function, str):
+            self.df[column_name] = expr.evaluate(self.df, function)
+        elif vectorized:
+            self.df[column_name] = function(self.df[column_name])
+        else:
+            self.df[column_name] = self.df[column_name].apply(function)
         return self
 
-    def change_values_conditionally(self, column_name, condition, function):
-        condition_result = self.df.eval(condition)
-        self.df.loc[condition_result, column_name] = self.df.loc[
-            condition_result, column_name
-        ].apply(function)
+    @plan.step
+    def change_values_conditionally(
+        self, column_name, condition, function, vectorized=False
+    ):
+        """Replace column_name where condition holds, using function in the
+        forms change_values takes. Expression strings and vectorized
+        callables run once over whole columns; only row-wise callables
+        are applied value by value."""
+        rows = expr.mask(self.df, condition)
+        if not rows.any():
+            return self
+        if isinstance(function, str):
+            values = expr.evaluate(self.df, function)
+            if isinstance(values, pd.Series):
+                values = values[rows]
+        elif vectorized:
+            values = function(self.df.loc[rows, column_name])
+        else:
+            values = self.df.loc[rows, column_name].apply(function)
+        schema_.allow(self.df, column_name, values)
+        self.df.loc[rows, column_name] = values
         return self
 
+    @plan.step
+    def join(
+        self,
+        other,
+        on=None,
+        left_on=None,
+        right_on=None,
+        how="left",
+        suffix="_right",
+        strategy="auto",
+    ):
+        """Add the columns of other to the rows whose keys match.
+
+        other is a frame, a DataMapper or a join.HashIndex built on its
+        keys, which is reused across calls; a frame is indexed for each
+        call, or once per run when the plan streams or runs in workers.
+        on names the key columns of both sides, or left_on and right_on
+        each one. how is "left" (unmatched rows get NaN) or "inner";
+        strategy "hash", "merge" (sorted keys) or "auto", which merges when
+        both sides are already sorted on a single numeric key. See
+        join.join.
+        """
+        if isinstance(other, DataMapper):
+            other = other.df
+        self.df = join_.join(
+            self.df,
+            other,
+            on if left_on is None else left_on,
+            on if right_on is None else right_on,
+            how=how,
+            suffix=suffix,
+            strategy=strategy,
+        )
+        return self
+
+    @plan.step
     def pivot(self, index, columns, values):
         self.df = self.df.pivot(
             index=index, columns=columns, values=values
         ).reset_index()
         return self
 
-    def to_json(self, json_file_path):
-        json_data = self.df.to_json(orient="records")
-        with open(json_file_path, "w") as json_file:
-            json.dump(json.loads(json_data), json_file, indent=4)
+    def to_json(
+        self,
+        json_file_path,
+        lines=False,
+        compression="infer",
+        chunksize=100_000,
+    ):
+        """Stream the records to json_file_path as an indented JSON array,
+        or as NDJSON with lines=True; see writers.write_json."""
+        writers.write_json(
+            self._chunks(),
+            json_file_path,
+            lines=lines,
+            compression=compression,
+            chunksize=chunksize,
+        )
+        self.commit()
+
+    def to_parquet(self, path, compression="snappy"):
+        """Stream the rows to a Parquet file, one row group per chunk;
+        needs pyarrow, and Arrow-backed columns are written without being
+        converted."""
+        arrow_.write_parquet(self._chunks(), path, compression=compression)
+        self.commit()
+
+    def to_ipc(self, path, compression=None):
+        """Stream the rows to an Arrow IPC (Feather v2) file, as to_parquet
+        does; see arrow.write_ipc."""
+        arrow_.write_ipc(self._chunks(), path, compression=compression)
+        self.commit()
 
-    def to_sql(self, table_name, connection_string):
-        engine = create_engine(connection_string)
-        self.df.to_sql(
-            name=table_name, con=engine, if_exists="replace", index=False
+    def to_sql(self, table_name, connection_string, **kwargs):
+        """Bulk load into table_name; kwargs and the returned load stats
+        are described in loader.load."""
+        if self._tail is not None:
+            kwargs.setdefault("if_exists", "append")
+        stats = loader.load(
+            self._chunks(), table_name, connection_string, **kwargs
         )
+        self.commit()
+        return stats
+
+    def commit(self):
+        """Save the incremental source's watermark past the rows read, so
+        the next run starts after them."""
+        if self._tail is not None:
+            self._tail.commit()
+
+
+def _replay(dataframe, steps, trace=None):
+    mapper = DataMapper(dataframe, trace=trace)
+    for s in steps:
+        getattr(mapper, s.op)(**s.params)
+    return mapper.df
+
+
+def _indexed(steps):
+    """steps with the frames they join against indexed, so every chunk or
+    partition probes one HashIndex instead of building its own."""
+    indexed = []
+    for s in steps:
+        p = s.params
+        if (
+            s.op == "join"
+            and isinstance(p["other"], pd.DataFrame)
+            and p["strategy"] != "merge"
+        ):
+            keys = p["on"] if p["right_on"] is None else p["right_on"]
+            other = join_.HashIndex(p["other"], keys)
+            s = plan.Step("join", dict(p, other=other))
+        indexed.append(s)
+    return indexed
+
+
+def _is_xlsx(path):
+    return os.fspath(path).lower().endswith((".xlsx", ".xlsm"))
+
+
+def _xlsx_scan(path, sheet_name, cache, converter, schema, checkpoints=None):
+    if cache is True:
+        cache = XlsxCache.default()
+    reader = cache.read_excel if cache else pd.read_excel
+    kwargs = dict(
+        engine="openpyxl",
+        sheet_name=sheet_name,
+        **schema_.reader_kwargs(schema),
+    )
+    if checkpoints:
+        return incremental_.RowsTail(
+            reader, path, checkpoints, converter, **kwargs
+        )
+    return plan.FileScan(reader, path, converter, **kwargs)
+
+
+def _checkpoints(incremental):
+    if incremental is True:
+        return incremental_.Checkpoints()
+    return incremental
+
+
+def _source(scan):
+    if isinstance(scan, plan.FilesScan):
+        return [s.path for s in scan.scans]
+    if isinstance(scan, plan.TableScan):
+        return f"table {scan.table_name}"
+    return getattr(scan, "path", "dataframe")
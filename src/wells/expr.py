@@ -0,0 +1,278 @@
+"""Condition and expression strings, compiled once and reused.
+
+The strings are the ones DataFrame.query and DataFrame.eval take: column
+names (`backticked` if they aren't identifiers), numbers and strings,
+arithmetic, comparisons, and/or/not (or &, |, ~), in and not in, and
+numpy functions such as sqrt and log. compile() parses a string the first
+time it's seen and returns the same Expression after that. Expressions
+are evaluated with numexpr, which is multi-threaded, when it's installed,
+the frame is big enough and every column they read is numeric; otherwise
+with pandas operations on whole columns.
+"""
+
+import ast
+import builtins
+import functools
+import io
+import tokenize
+
+import numpy as np
+import pandas as pd
+
+try:
+    import numexpr
+except ImportError:
+    numexpr = None
+
+# below this many rows numexpr's setup costs more than it saves
+NUMEXPR_MIN_ROWS = 10_000
+
+FUNCTIONS = {
+    "abs": np.abs,
+    "sqrt": np.sqrt,
+    "exp": np.exp,
+    "expm1": np.expm1,
+    "log": np.log,
+    "log1p": np.log1p,
+    "log10": np.log10,
+    "sin": np.sin,
+    "cos": np.cos,
+    "tan": np.tan,
+    "arcsin": np.arcsin,
+    "arccos": np.arccos,
+    "arctan": np.arctan,
+    "sinh": np.sinh,
+    "cosh": np.cosh,
+    "tanh": np.tanh,
+    "floor": np.floor,
+    "ceil": np.ceil,
+}
+
+NUMEXPR_FUNCTIONS = frozenset(FUNCTIONS) - {"floor", "ceil"}
+
+NUMEXPR_NODES = (
+    ast.Expression,
+    ast.BinOp,
+    ast.UnaryOp,
+    ast.Compare,
+    ast.Name,
+    ast.Load,
+    ast.Add,
+    ast.Sub,
+    ast.Mult,
+    ast.Div,
+    ast.Pow,
+    ast.Mod,
+    ast.USub,
+    ast.UAdd,
+    ast.Invert,
+    ast.BitAnd,
+    ast.BitOr,
+    ast.Eq,
+    ast.NotEq,
+    ast.Lt,
+    ast.LtE,
+    ast.Gt,
+    ast.GtE,
+)
+
+
+@functools.lru_cache(maxsize=1024)
+def compile(source):
+    """The Expression for source; raises SyntaxError if it can't be
+    parsed."""
+    return Expression(source)
+
+
+class Expression:
+    """A parsed expression. Calling it with a frame evaluates it against
+    the frame's columns, usually to a Series aligned with the frame."""
+
+    def __init__(self, source):
+        self.source = source
+        text, self._aliases = _backticks(source)
+        tree = ast.parse(_booleans(text), mode="eval")
+        called = {
+            n.func.id
+            for n in ast.walk(tree)
+            if isinstance(n, ast.Call) and isinstance(n.func, ast.Name)
+        }
+        self.columns = frozenset(
+            self._aliases.get(n.id, n.id)
+            for n in ast.walk(tree)
+            if isinstance(n, ast.Name) and n.id not in called
+        )
+        tree = ast.fix_missing_locations(_Vectorize().visit(tree))
+        self._code = builtins.compile(tree, repr(source), "eval")
+        self._numexpr = _numexpr_source(tree)
+
+    def __call__(self, dataframe):
+        if (
+            numexpr is not None
+            and self._numexpr is not None
+            and len(dataframe) >= NUMEXPR_MIN_ROWS
+        ):
+            arrays = self._arrays(dataframe)
+            if arrays is not None:
+                try:
+                    result = numexpr.evaluate(self._numexpr, arrays)
+                except (TypeError, ValueError, NotImplementedError):
+                    pass
+                else:
+                    return pd.Series(result, index=dataframe.index)
+        return eval(self._code, GLOBALS, _Namespace(dataframe, self._aliases))
+
+    def __repr__(self):
+        return f"Expression({self.source!r})"
+
+    def _arrays(self, dataframe):
+        names = {column: alias for alias, column in self._aliases.items()}
+        arrays = {}
+        for column in self.columns:
+            if column not in dataframe.columns:
+                return None
+            dtype = dataframe[column].dtype
+            if not isinstance(dtype, np.dtype) or dtype.kind not in "biuf":
+                return None
+            arrays[names.get(column, column)] = dataframe[column].to_numpy()
+        return arrays
+
+
+def evaluate(dataframe, source):
+    """Evaluate source against dataframe, with DataFrame.eval for anything
+    compile() doesn't handle (assignments, @locals, the index)."""
+    try:
+        return compile(source)(dataframe)
+    except (SyntaxError, NameError):
+        return dataframe.eval(source)
+
+
+def mask(dataframe, condition):
+    """Boolean row mask for the condition string."""
+    result = evaluate(dataframe, condition)
+    if not isinstance(result, pd.Series):
+        result = pd.Series(result, index=dataframe.index)
+    if result.dtype != bool:
+        result = result.fillna(False).astype(bool)
+    return result
+
+
+class _Namespace(dict):
+    # columns are only fetched when the expression reads them
+    def __init__(self, dataframe, aliases):
+        super().__init__()
+        self.dataframe = dataframe
+        self.aliases = aliases
+
+    def __missing__(self, name):
+        column = self.aliases.get(name, name)
+        if column in self.dataframe.columns:
+            return self.dataframe[column]
+        raise KeyError(name)
+
+
+def _isin(values, collection):
+    if isinstance(collection, (pd.Series, pd.Index, np.ndarray)):
+        collection = pd.unique(collection)
+    elif not isinstance(collection, (list, tuple, set, frozenset)):
+        collection = [collection]
+    if np.isscalar(values):
+        return values in collection
+    return values.isin(collection)
+
+
+GLOBALS = {"__builtins__": {}, "__isin": _isin, **FUNCTIONS}
+
+
+class _Vectorize(ast.NodeTransformer):
+    """Turn the Python operators that don't work element-wise into ones
+    that do: and/or/not into &/|/~, chained comparisons into & of pairs,
+    and in, not in and == against a list into isin."""
+
+    def visit_BoolOp(self, node):
+        self.generic_visit(node)
+        op = ast.BitAnd() if isinstance(node.op, ast.And) else ast.BitOr()
+        result = node.values[0]
+        for value in node.values[1:]:
+            result = ast.BinOp(left=result, op=op, right=value)
+        return result
+
+    def visit_UnaryOp(self, node):
+        self.generic_visit(node)
+        if isinstance(node.op, ast.Not):
+            return ast.UnaryOp(op=ast.Invert(), operand=node.operand)
+        return node
+
+    def visit_Compare(self, node):
+        self.generic_visit(node)
+        pairs = []
+        left = node.left
+        for op, right in zip(node.ops, node.comparators):
+            pairs.append(_compare(left, op, right))
+            left = right
+        result = pairs[0]
+        for pair in pairs[1:]:
+            result = ast.BinOp(left=result, op=ast.BitAnd(), right=pair)
+        return result
+
+
+def _compare(left, op, right):
+    listed = isinstance(right, (ast.List, ast.Tuple, ast.Set))
+    if isinstance(op, (ast.In, ast.NotIn)) or (
+        listed and isinstance(op, (ast.Eq, ast.NotEq))
+    ):
+        isin = ast.Call(
+            func=ast.Name(id="__isin", ctx=ast.Load()),
+            args=[left, right],
+            keywords=[],
+        )
+        if isinstance(op, (ast.NotIn, ast.NotEq)):
+            return ast.UnaryOp(op=ast.Invert(), operand=isin)
+        return isin
+    return ast.Compare(left=left, ops=[op], comparators=[right])
+
+
+def _backticks(source):
+    # `quoted names` become identifiers that can't clash with the source
+    parts = source.split("`")
+    if len(parts) % 2 == 0:
+        raise SyntaxError(f"unbalanced backticks in {source!r}")
+    aliases = {}
+    for i in range(1, len(parts), 2):
+        alias = f"BACKTICK{len(aliases)}"
+        while alias in source:
+            alias += "_"
+        aliases[alias] = parts[i]
+        parts[i] = alias
+    return "".join(parts), aliases
+
+
+def _booleans(text):
+    # as in pandas, & and | bind more loosely than comparisons, like and
+    # and or, so "a > 1 & b < 2" means what it says
+    tokens = []
+    for token in tokenize.generate_tokens(io.StringIO(text).readline):
+        if token.type == tokenize.OP and token.string in ("&", "|"):
+            word = "and" if token.string == "&" else "or"
+            token = token._replace(type=tokenize.NAME, string=f" {word} ")
+        tokens.append(token[:2])
+    return tokenize.untokenize(tokens).strip()
+
+
+def _numexpr_source(tree):
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Constant):
+            if isinstance(node.value, bool) or not isinstance(
+                node.value, (int, float)
+            ):
+                return None
+        elif isinstance(node, ast.Call):
+            if (
+                not isinstance(node.func, ast.Name)
+                or node.func.id not in NUMEXPR_FUNCTIONS
+                or node.keywords
+            ):
+                return None
+        elif not isinstance(node, NUMEXPR_NODES):
+            return None
+    return ast.unparse(tree)
@@ -0,0 +1,245 @@
+"""Incremental runs over sources that only grow.
+
+A Checkpoints file keeps one watermark per source. The tail scans below
+read only what was added since their watermark: CSV files from the byte
+offset after the last row read, workbooks from the row count, and tables
+from the largest key read. Reading doesn't move the watermark; commit()
+does, and DataMapper commits once to_sql or to_json has written the
+rows, so a failed run is simply retried from the same place.
+"""
+
+import hashlib
+import io
+import json
+import os
+import tempfile
+
+import pandas as pd
+
+from wells import plan
+from wells.cache import default_directory
+
+# bytes before a CSV watermark that must be unchanged on the next run
+CHECK_BYTES = 4096
+
+
+class SourceChanged(ValueError):
+    """The source was rewritten rather than appended to since its
+    watermark; reset() the watermark to read it again from the start."""
+
+
+class Checkpoints:
+    """Watermarks by source, in a JSON file (checkpoints.json under
+    $WELLS_CACHE_DIR by default)."""
+
+    def __init__(self, path=None):
+        if path is None:
+            path = os.path.join(default_directory(), "checkpoints.json")
+        self.path = os.fspath(path)
+
+    def get(self, source):
+        return self._load().get(source)
+
+    def put(self, source, mark):
+        marks = self._load()
+        marks[source] = mark
+        self._save(marks)
+
+    def reset(self, source=None):
+        """Forget source's watermark, or every watermark."""
+        marks = self._load()
+        if source is None:
+            marks = {}
+        else:
+            marks.pop(source, None)
+        self._save(marks)
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def _save(self, marks):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        fd, temporary = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(marks, f, indent=2, default=str)
+            os.replace(temporary, self.path)
+        except BaseException:
+            os.unlink(temporary)
+            raise
+
+
+class Tail:
+    """A scan that reads what its source gained since its watermark;
+    pending is the watermark after the last read, saved by commit()."""
+
+    pending = None
+
+    def mark(self):
+        return self.checkpoints.get(self.source)
+
+    def commit(self):
+        if self.pending is not None:
+            self.checkpoints.put(self.source, self.pending)
+            self.pending = None
+
+
+class CsvTail(Tail, plan.FileScan):
+    """The rows appended to a CSV file since its watermark.
+
+    The last line counts as a row even without a newline, as it does for
+    pd.read_csv. With wait_for_newline=True it is left for the next run
+    instead, for files a writer may be partway through appending to.
+    """
+
+    def __init__(
+        self, path, checkpoints, convert=None, wait_for_newline=False, **kwargs
+    ):
+        super().__init__(pd.read_csv, path, convert, **kwargs)
+        self.checkpoints = checkpoints
+        self.wait_for_newline = wait_for_newline
+        self.source = f"csv:{os.path.abspath(path)}"
+        self._full_header = None
+
+    def load(self, columns=None):
+        data, mark = self._new_bytes()
+        dataframe = pd.read_csv(data, **self._kwargs(columns, mark))
+        if columns is not None:
+            dataframe = plan._select(dataframe, columns)
+        rows = mark["rows"] if mark else 0
+        dataframe.index = pd.RangeIndex(rows, rows + len(dataframe))
+        self.pending = self._next(rows + len(dataframe))
+        return dataframe
+
+    def chunks(self, columns=None, chunksize=None):
+        data, mark = self._new_bytes()
+        kwargs = dict(self._kwargs(columns, mark), chunksize=chunksize)
+        rows = mark["rows"] if mark else 0
+        with pd.read_csv(data, **kwargs) as reader:
+            for chunk in reader:
+                if columns is not None:
+                    chunk = plan._select(chunk, columns)
+                chunk.index = pd.RangeIndex(rows, rows + len(chunk))
+                rows += len(chunk)
+                yield self._convert(chunk)
+        self.pending = self._next(rows)
+
+    def _new_bytes(self):
+        mark = self.mark()
+        start = 0 if mark is None else mark["offset"]
+        with open(self.path, "rb") as f:
+            if mark is not None and _check(f, start) != mark["check"]:
+                raise SourceChanged(f"{self.path} changed before its mark")
+            f.seek(start)
+            data = f.read()
+        if self.wait_for_newline:
+            data = data[: data.rfind(b"\n") + 1]
+        self._end = start + len(data)
+        return io.BytesIO(data), mark
+
+    def _kwargs(self, columns, mark):
+        kwargs = dict(self.kwargs)
+        if columns is not None:
+            kwargs["usecols"] = columns
+        if mark is not None:
+            # names has to be the whole header: usecols, the schema's or
+            # columns, picks from it by name
+            kwargs.update(header=None, names=self._header())
+        return kwargs
+
+    def _header(self):
+        if self._full_header is None:
+            kwargs = dict(self.kwargs, nrows=0)
+            kwargs.pop("usecols", None)
+            self._full_header = list(pd.read_csv(self.path, **kwargs).columns)
+        return self._full_header
+
+    def _next(self, rows):
+        with open(self.path, "rb") as f:
+            check = _check(f, self._end)
+        return {"offset": self._end, "rows": rows, "check": check}
+
+
+class RowsTail(Tail, plan.FileScan):
+    """The rows past a row-count watermark in a file that has to be parsed
+    whole, such as a workbook sheet."""
+
+    def __init__(self, reader, path, checkpoints, convert=None, **kwargs):
+        super().__init__(reader, path, convert, **kwargs)
+        self.checkpoints = checkpoints
+        sheet = kwargs.get("sheet_name")
+        self.source = f"rows:{os.path.abspath(path)}:{sheet}"
+
+    def load(self, columns=None):
+        dataframe = super().load(columns)
+        mark = self.mark()
+        rows = 0 if mark is None else mark["rows"]
+        if len(dataframe) < rows:
+            raise SourceChanged(f"{self.path} has fewer rows than its mark")
+        self.pending = {"rows": len(dataframe)}
+        return dataframe.iloc[rows:]
+
+    def chunks(self, columns=None, chunksize=None):
+        return plan.FrameScan(self.read(columns)).chunks(chunksize=chunksize)
+
+
+class TableTail(Tail, plan.TableScan):
+    """The rows of a table whose key is above the largest key read so far.
+
+    key must only grow: an autoincrement id or an insertion timestamp.
+    """
+
+    def __init__(
+        self, table_name, connection_string, key, checkpoints, convert=None
+    ):
+        super().__init__(table_name, connection_string, convert)
+        self.key = key
+        self.checkpoints = checkpoints
+        self.source = f"table:{connection_string}:{table_name}:{key}"
+
+    def read(self, columns=None):
+        return self._keep(super().read(self._with_key(columns)), columns)
+
+    def chunks(self, columns=None, chunksize=None):
+        for chunk in super().chunks(self._with_key(columns), chunksize):
+            yield self._keep(chunk, columns)
+
+    def query(self, columns=None):
+        query = super().query(columns)
+        table = query.get_final_froms()[0]
+        mark = self.mark()
+        if mark is not None:
+            query = query.where(table.c[self.key] > mark["key"])
+        return query.order_by(table.c[self.key])
+
+    def _with_key(self, columns):
+        if columns is None or self.key in columns:
+            return columns
+        return list(columns) + [self.key]
+
+    def _keep(self, dataframe, columns):
+        if len(dataframe):
+            latest = dataframe[self.key].max()
+            if self.pending is None or latest > self.pending["key"]:
+                self.pending = {"key": _plain(latest)}
+        if columns is not None:
+            dataframe = plan._select(dataframe, columns)
+        return dataframe
+
+
+def _check(f, offset):
+    f.seek(max(offset - CHECK_BYTES, 0))
+    block = f.read(min(offset, CHECK_BYTES))
+    if len(block) < min(offset, CHECK_BYTES):
+        return None
+    return hashlib.sha256(block).hexdigest()
+
+
+def _plain(value):
+    # numpy scalars as the Python values json can store
+    return value.item() if hasattr(value, "item") else value
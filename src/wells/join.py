@@ -0,0 +1,181 @@
+"""Joins for DataMapper.join.
+
+The right side is always held in memory and broadcast to every chunk or
+partition of the left, so inner and left joins stay row-local and stream.
+Rows are matched through a HashIndex on the right's keys, built for the
+join (once per run when the left is streamed or split into partitions)
+or passed in ready-made, or, when both sides are already sorted on one
+numeric key, by binary search on the sorted keys. Keys match like SQL:
+missing keys match nothing.
+"""
+
+import numpy as np
+import pandas as pd
+
+HOWS = ("inner", "left")
+STRATEGIES = ("auto", "hash", "merge")
+
+
+class HashIndex:
+    """dataframe indexed on keys (a column or list of columns).
+
+    Building one costs a pass over the keys; probing it costs one hash
+    lookup per probe row. Indexes are read-only: build a new one if the
+    frame changes.
+    """
+
+    def __init__(self, dataframe, keys):
+        self.dataframe = dataframe
+        self.keys = _as_list(keys)
+        codes, self._uniques = pd.factorize(_key_index(dataframe, self.keys))
+        counts = np.bincount(codes[codes >= 0], minlength=len(self._uniques))
+        self.unique = bool((counts <= 1).all())
+        # rows in key order, rows with missing keys first
+        self._order = np.argsort(codes, kind="stable")
+        missing = int((codes < 0).sum())
+        self._starts = missing + np.concatenate([[0], np.cumsum(counts)[:-1]])
+        self._counts = counts
+
+    def __len__(self):
+        return len(self.dataframe)
+
+    def __repr__(self):
+        return f"HashIndex(rows={len(self)}, keys={self.keys!r})"
+
+    def lookup(self, keys, how="inner"):
+        """(probe rows, matching rows) position arrays for the probe keys,
+        an Index or MultiIndex; with how="left" unmatched probe rows are
+        kept with a matching row of -1."""
+        codes = self._uniques.get_indexer(keys)
+        found = codes >= 0
+        if self.unique and len(self._uniques):
+            right = np.where(found, self._order[self._starts[codes]], -1)
+            if how == "left":
+                return np.arange(len(codes)), right
+            return np.flatnonzero(found), right[found]
+        counts = np.where(found, self._counts[codes], 0)
+        starts = np.where(found, self._starts[codes], 0)
+        return _expand(counts, starts, self._order, how)
+
+
+def join(
+    left,
+    right,
+    left_on,
+    right_on,
+    how="left",
+    suffix="_right",
+    strategy="auto",
+):
+    """left with the columns of right, a frame or HashIndex, added for the
+    rows whose keys match. right's key columns are left out, and its
+    other columns that clash with left's get suffix."""
+    if how not in HOWS:
+        raise ValueError(f"unsupported how={how!r}")
+    if strategy not in STRATEGIES:
+        raise ValueError(f"unknown strategy={strategy!r}")
+    if left_on is None or right_on is None:
+        raise ValueError("join needs on, or left_on and right_on")
+    left_on, right_on = _as_list(left_on), _as_list(right_on)
+    if len(left_on) != len(right_on):
+        raise ValueError("left_on and right_on need as many columns")
+    if isinstance(right, HashIndex):
+        if right.keys != right_on:
+            raise ValueError(f"index is on {right.keys}, not {right_on}")
+        if strategy == "merge":
+            raise ValueError("a HashIndex can't be sort-merge joined")
+        frame = right.dataframe
+    else:
+        frame = right
+    if strategy == "auto":
+        strategy = (
+            "merge" if _presorted(left, frame, left_on, right_on) else "hash"
+        )
+    if strategy == "merge":
+        left_rows, right_rows = _merge(left, frame, left_on, right_on, how)
+    else:
+        if not isinstance(right, HashIndex):
+            right = HashIndex(frame, right_on)
+        probe = _key_index(left, left_on)
+        left_rows, right_rows = right.lookup(probe, how)
+    return _assemble(left, frame, left_rows, right_rows, right_on, suffix)
+
+
+def _merge(left, right, left_on, right_on, how):
+    if len(left_on) != 1:
+        raise ValueError("sort-merge joins need a single key column")
+    keys = right[right_on[0]].to_numpy()
+    if keys.dtype.kind not in "iufmM":
+        raise ValueError("sort-merge joins need numeric or datetime keys")
+    if len(keys) and (keys[1:] < keys[:-1]).any():
+        order = np.argsort(keys, kind="stable")
+        keys = keys[order]
+    else:
+        order = np.arange(len(keys))
+    probe = left[left_on[0]].to_numpy()
+    starts = np.searchsorted(keys, probe, "left")
+    counts = np.searchsorted(keys, probe, "right") - starts
+    counts[pd.isna(probe)] = 0
+    return _expand(counts, starts, order, how)
+
+
+def _expand(counts, starts, order, how):
+    # probe row i matches rows order[starts[i]:starts[i] + counts[i]]
+    unmatched = counts == 0
+    if how == "left":
+        counts = np.where(unmatched, 1, counts)
+    left = np.repeat(np.arange(len(counts)), counts)
+    first = np.repeat(np.cumsum(counts) - counts, counts)
+    positions = np.repeat(starts, counts) + np.arange(len(left)) - first
+    matched = ~np.repeat(unmatched, counts)
+    right = np.full(len(left), -1, dtype=np.intp)
+    right[matched] = order[positions[matched]]
+    return left, right
+
+
+def _assemble(left, right, left_rows, right_rows, right_on, suffix):
+    result = left.take(left_rows)
+    fill = bool((right_rows < 0).any())
+    columns = {}
+    for name in right.columns:
+        if name in right_on:
+            continue
+        column = right[name]
+        if isinstance(column.dtype, np.dtype):
+            values = column.to_numpy()
+        else:
+            values = column.array
+        taken = pd.api.extensions.take(values, right_rows, allow_fill=fill)
+        columns[name + suffix if name in left.columns else name] = taken
+    for name, values in columns.items():
+        result[name] = values
+    return result
+
+
+def _presorted(left, right, left_on, right_on):
+    if len(left_on) != 1:
+        return False
+    left_keys, right_keys = left[left_on[0]], right[right_on[0]]
+    for keys in (left_keys, right_keys):
+        if (
+            not isinstance(keys.dtype, np.dtype)
+            or keys.dtype.kind not in "iufmM"
+        ):
+            return False
+    return (
+        right_keys.is_monotonic_increasing
+        and left_keys.is_monotonic_increasing
+        and not right_keys.hasnans
+    )
+
+
+def _key_index(dataframe, keys):
+    if len(keys) == 1:
+        return pd.Index(dataframe[keys[0]])
+    return pd.MultiIndex.from_frame(dataframe[keys])
+
+
+def _as_list(columns):
+    if isinstance(columns, (list, tuple)):
+        return list(columns)
+    return [columns]
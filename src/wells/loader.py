@@ -0,0 +1,224 @@
+import datetime
+import os
+import time
+import weakref
+
+import pandas as pd
+from sqlalchemy import Index
+from sqlalchemy import MetaData
+from sqlalchemy import Table
+from sqlalchemy import create_engine
+
+_engines = {}
+# per pandas SQLTable, the positions of columns holding dates or times
+_temporal = weakref.WeakKeyDictionary()
+
+SQLITE_PRAGMAS = {
+    "synchronous": "OFF",
+    "journal_mode": "MEMORY",
+    "temp_store": "MEMORY",
+    "cache_size": "-262144",
+}
+
+
+def url(connection_string):
+    """connection_string as a SQLAlchemy URL; a bare file path is taken to
+    be a SQLite database."""
+    connection_string = os.fspath(connection_string)
+    if "://" not in connection_string:
+        connection_string = f"sqlite:///{connection_string}"
+    return connection_string
+
+
+def engine(connection_string):
+    """Pooled engine shared by every load to connection_string.
+
+    A bare file path is taken to be a SQLite database.
+    """
+    connection_string = url(connection_string)
+    if connection_string not in _engines:
+        _engines[connection_string] = create_engine(connection_string)
+    return _engines[connection_string]
+
+
+def load(
+    chunks,
+    table_name,
+    connection_string,
+    if_exists="replace",
+    key=None,
+    chunksize=50_000,
+    method=None,
+    indexes=(),
+):
+    """Load frames into table_name in a single transaction.
+
+    if_exists is "replace", "append" or "upsert"; upsert needs key, the
+    column (or list of columns) that identifies a row, and updates rows
+    whose key is already in the table. method is passed to
+    DataFrame.to_sql ("multi" for multi-row INSERTs, None for executemany);
+    on SQLite None goes straight to the driver's executemany, which skips
+    SQLAlchemy's per-row parameter handling. On SQLite existing indexes
+    are dropped for the load and rebuilt after it, together with indexes,
+    a list of columns or column tuples.
+
+    Returns {"rows", "seconds", "rows_per_second"}.
+    """
+    if if_exists not in ("replace", "append", "upsert"):
+        raise ValueError(f"unsupported if_exists {if_exists!r}")
+    if if_exists == "upsert":
+        if key is None:
+            raise ValueError("upsert needs a key")
+        key = [key] if isinstance(key, str) else list(key)
+        method = _upsert(key)
+    start = time.perf_counter()
+    rows = 0
+    with engine(connection_string).connect() as conn:
+        sqlite = conn.dialect.name == "sqlite"
+        if sqlite and method is None:
+            method = _executemany
+        saved = _set_pragmas(conn, SQLITE_PRAGMAS) if sqlite else {}
+        try:
+            with conn.begin():
+                deferred = []
+                mode = "replace" if if_exists == "replace" else "append"
+                for i, chunk in enumerate(chunks):
+                    if i == 0 and mode == "append":
+                        _prepare(conn, chunk, table_name, key)
+                        if sqlite and key is None:
+                            deferred = _drop_indexes(conn, table_name)
+                    chunk.to_sql(
+                        name=table_name,
+                        con=conn,
+                        if_exists=mode,
+                        index=False,
+                        chunksize=chunksize,
+                        method=method,
+                    )
+                    mode = "append"
+                    rows += len(chunk)
+                for sql in deferred:
+                    conn.exec_driver_sql(sql)
+                _create_indexes(conn, table_name, indexes)
+        finally:
+            _set_pragmas(conn, saved)
+    seconds = time.perf_counter() - start
+    return {
+        "rows": rows,
+        "seconds": seconds,
+        "rows_per_second": rows / seconds if seconds else 0.0,
+    }
+
+
+def _set_pragmas(conn, pragmas):
+    saved = {}
+    for name, value in pragmas.items():
+        saved[name] = conn.exec_driver_sql(f"PRAGMA {name}").scalar()
+        conn.exec_driver_sql(f"PRAGMA {name}={value}")
+    conn.commit()
+    return saved
+
+
+def _prepare(conn, chunk, table_name, key):
+    """Create the table if needed and, for upserts, a unique index on key."""
+    chunk.head(0).to_sql(
+        name=table_name, con=conn, if_exists="append", index=False
+    )
+    if key is not None:
+        _create_indexes(conn, table_name, [tuple(key)], unique=True)
+
+
+def _drop_indexes(conn, table_name):
+    result = conn.exec_driver_sql(
+        "SELECT name, sql FROM sqlite_master "
+        "WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL",
+        (table_name,),
+    )
+    indexes = result.fetchall()
+    for name, _ in indexes:
+        conn.exec_driver_sql(f'DROP INDEX "{name}"')
+    return [sql for _, sql in indexes]
+
+
+def _create_indexes(conn, table_name, indexes, unique=False):
+    if not indexes:
+        return
+    table = Table(table_name, MetaData(), autoload_with=conn)
+    for columns in indexes:
+        columns = [columns] if isinstance(columns, str) else list(columns)
+        name = f"ix_{table_name}_{'_'.join(columns)}"
+        index = Index(name, *(table.c[c] for c in columns), unique=unique)
+        index.create(conn, checkfirst=True)
+
+
+def _executemany(table, conn, keys, data_iter):
+    columns = ", ".join(f'"{k}"' for k in keys)
+    marks = ", ".join("?" * len(keys))
+    cursor = conn.connection.cursor()
+    if table not in _temporal:
+        _temporal[table] = [
+            i for i, k in enumerate(keys) if _holds_dates(table.frame[k])
+        ]
+    temporal = _temporal[table]
+    if temporal:
+        data_iter = (_sqlite_row(row, temporal) for row in data_iter)
+    cursor.executemany(
+        f'INSERT INTO "{table.name}" ({columns}) VALUES ({marks})', data_iter
+    )
+    return cursor.rowcount
+
+
+def _holds_dates(column):
+    if column.dtype.kind == "M":
+        return True
+    if column.dtype.kind != "O":
+        return False
+    inferred = pd.api.types.infer_dtype(column, skipna=True)
+    return inferred not in ("string", "bytes", "empty")
+
+
+def _sqlite_row(row, temporal):
+    # the strings SQLAlchemy's SQLite DATETIME, DATE and TIME types store,
+    # rather than sqlite3's deprecated default adapters
+    row = list(row)
+    for i in temporal:
+        value = row[i]
+        if isinstance(value, datetime.datetime):
+            row[i] = value.strftime("%Y-%m-%d %H:%M:%S.%f")
+        elif isinstance(value, datetime.date):
+            row[i] = value.isoformat()
+        elif isinstance(value, datetime.time):
+            row[i] = value.strftime("%H:%M:%S.%f")
+    return row
+
+
+def _upsert(key):
+    def insert_rows(table, conn, keys, data_iter):
+        rows = [dict(zip(keys, row)) for row in data_iter]
+        statement = _insert(conn.dialect.name)(table.table)
+        columns = [c for c in keys if c not in key]
+        if conn.dialect.name == "mysql":
+            update = {c: statement.inserted[c] for c in columns or key}
+            statement = statement.on_duplicate_key_update(**update)
+        elif columns:
+            update = {c: statement.excluded[c] for c in columns}
+            statement = statement.on_conflict_do_update(
+                index_elements=key, set_=update
+            )
+        else:
+            statement = statement.on_conflict_do_nothing(index_elements=key)
+        return conn.execute(statement, rows).rowcount
+
+    return insert_rows
+
+
+def _insert(dialect):
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    elif dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "mysql":
+        from sqlalchemy.dialects.mysql import insert
+    else:
+        raise ValueError(f"upsert is not supported on {dialect}")
+    return insert
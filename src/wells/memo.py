@@ -0,0 +1,223 @@
+import collections
+import hashlib
+import os
+import types
+
+import numpy as np
+import pandas as pd
+
+from wells import plan
+from wells.cache import DiskCache
+from wells.cache import default_directory
+from wells.join import HashIndex
+
+
+class Unfingerprintable(TypeError):
+    pass
+
+
+class PipelineCache:
+    """Step results keyed by fingerprint, in memory and on disk.
+
+    A step's fingerprint covers the source (file path, size and mtime, or
+    a hash of the frame), every step before it and its own arguments. The
+    memory tier holds up to memory_bytes of frames, least recently used
+    first out; the disk tier is a DiskCache capped at max_bytes whose
+    entries also expire max_age seconds after they were stored.
+    """
+
+    def __init__(
+        self,
+        directory=None,
+        max_bytes=2 * 1024**3,
+        max_age=None,
+        memory_bytes=256 * 1024**2,
+    ):
+        if directory is None:
+            directory = os.path.join(default_directory(), "pipeline")
+        self.disk = DiskCache(directory, max_bytes, max_age)
+        self.memory_bytes = memory_bytes
+        self.memory = collections.OrderedDict()
+        self.stats = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "stores": 0,
+        }
+
+    def get(self, key):
+        if key in self.memory:
+            self.memory.move_to_end(key)
+            self.stats["memory_hits"] += 1
+            return self.memory[key].copy()
+        dataframe = self.disk.get(key)
+        if dataframe is None:
+            self.stats["misses"] += 1
+            return None
+        self.stats["disk_hits"] += 1
+        self._remember(key, dataframe.copy())
+        return dataframe
+
+    def put(self, key, dataframe):
+        self.stats["stores"] += 1
+        self._remember(key, dataframe.copy())
+        self.disk.put(key, dataframe)
+
+    def clear(self):
+        self.memory.clear()
+        self.disk.invalidate()
+
+    def run(self, scan, scan_columns, steps, run):
+        """Run steps over scan, resuming after the deepest cached step."""
+        keys = fingerprints(scan, scan_columns, steps)
+        start, dataframe = 0, None
+        for i in range(len(steps), 0, -1):
+            if keys[i] is not None:
+                dataframe = self.get(keys[i])
+                if dataframe is not None:
+                    start = i
+                    break
+        if dataframe is None:
+            dataframe = scan.read(scan_columns)
+        for i in range(start, len(steps)):
+            dataframe = run(dataframe, [steps[i]])
+            if keys[i + 1] is not None:
+                self.put(keys[i + 1], dataframe)
+        return dataframe
+
+    def _remember(self, key, dataframe):
+        size = int(dataframe.memory_usage(deep=False).sum())
+        if size > self.memory_bytes:
+            return
+        self.memory[key] = dataframe
+        total = sum(
+            int(d.memory_usage(deep=False).sum()) for d in self.memory.values()
+        )
+        while total > self.memory_bytes:
+            _, evicted = self.memory.popitem(last=False)
+            total -= int(evicted.memory_usage(deep=False).sum())
+
+
+def fingerprints(scan, scan_columns, steps):
+    """Fingerprint of the source followed by one per step; None from the
+    first step whose arguments can't be fingerprinted onwards."""
+    try:
+        key = _digest(_scan_token(scan), token(scan_columns))
+    except Unfingerprintable:
+        return [None] * (len(steps) + 1)
+    keys = [key]
+    for s in steps:
+        try:
+            key = _digest(key, s.op, token(s.params))
+        except Unfingerprintable:
+            return keys + [None] * (len(steps) + 1 - len(keys))
+        keys.append(key)
+    return keys
+
+
+def token(value):
+    """A stable string for value that changes whenever value does."""
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return f"{type(value).__name__}:{value!r}"
+    if isinstance(value, np.generic):
+        return f"{type(value).__name__}:{value!r}"
+    if isinstance(value, (list, tuple)):
+        return f"{type(value).__name__}[{','.join(map(token, value))}]"
+    if isinstance(value, (set, frozenset)):
+        return f"set[{','.join(sorted(map(token, value)))}]"
+    if isinstance(value, dict):
+        items = sorted(f"{token(k)}={token(v)}" for k, v in value.items())
+        return f"dict[{','.join(items)}]"
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return f"frame:{_frame_hash(value)}"
+    if isinstance(value, HashIndex):
+        return f"index:{token(value.keys)}:{_frame_hash(value.dataframe)}"
+    if isinstance(value, types.FunctionType):
+        return _function_token(value)
+    if isinstance(value, types.MethodType):
+        function = token(value.__func__)
+        return f"method[{function},{token(value.__self__)}]"
+    if callable(value) and hasattr(value, "__qualname__"):
+        module = getattr(value, "__module__", None)
+        name = f"callable:{module}.{value.__qualname__}"
+        # a builtin bound to an object, like some_dict.get, answers from it
+        bound = getattr(value, "__self__", None)
+        if bound is None or isinstance(bound, types.ModuleType):
+            return name
+        return f"{name}[{token(bound)}]"
+    raise Unfingerprintable(f"can't fingerprint {type(value).__name__}")
+
+
+def _digest(*parts):
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def _frame_hash(dataframe):
+    try:
+        hashed = pd.util.hash_pandas_object(dataframe, index=True)
+    except TypeError as e:
+        raise Unfingerprintable(str(e))
+    header = token([str(c) for c in getattr(dataframe, "columns", [])])
+    dtypes = token([str(d) for d in np.atleast_1d(dataframe.dtypes)])
+    return _digest(header, dtypes, hashlib.sha256(hashed.values).hexdigest())
+
+
+def _function_token(function):
+    code = function.__code__
+    parts = [_code_token(code)]
+    for name in code.co_names:
+        if name in function.__globals__:
+            parts.append(f"{name}={_global_token(function.__globals__[name])}")
+    for cell in function.__closure__ or ():
+        parts.append(token(cell.cell_contents))
+    parts.append(token(function.__defaults__))
+    return f"function[{','.join(parts)}]"
+
+
+def _code_token(code):
+    consts = [
+        _code_token(c) if isinstance(c, types.CodeType) else token(c)
+        for c in code.co_consts
+    ]
+    return _digest(code.co_code.hex(), *consts, *code.co_names)
+
+
+def _global_token(value):
+    if isinstance(value, types.ModuleType):
+        return f"module:{value.__name__}"
+    if isinstance(value, types.FunctionType):
+        # code only, so recursive functions don't recurse here
+        name = f"{value.__module__}.{value.__qualname__}"
+        return f"function:{name}:{_code_token(value.__code__)}"
+    return token(value)
+
+
+def _scan_token(scan):
+    if isinstance(scan, plan.FrameScan):
+        return f"frame:{_frame_hash(scan.dataframe)}"
+    if isinstance(scan, plan.FilesScan):
+        files = ",".join(_scan_token(s) for s in scan.scans)
+        return f"files[{files}]:{token(scan.source_column)}"
+    if isinstance(scan, plan.TableScan):
+        raise Unfingerprintable("can't tell whether a table has changed")
+    stat = os.stat(scan.path)
+    convert = scan.convert
+    if convert is not None:
+        convert = [
+            convert.schema,
+            convert.optimize,
+            convert.threshold,
+            convert.arrow,
+        ]
+    return _digest(
+        os.path.abspath(scan.path),
+        str(stat.st_size),
+        str(stat.st_mtime_ns),
+        scan.reader.__qualname__,
+        token(scan.kwargs),
+        token(convert),
+    )
@@ -0,0 +1,105 @@
+import functools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from wells import spill
+from wells import stream
+
+# (parts, row_steps, final, run) in a worker process, set by the pool's
+# initializer; a forked worker gets it without pickling, so neither the
+# partitions nor the steps (lambdas included) have to be picklable
+_job = None
+
+
+def execute(parts, steps, run, workers, renumber=False):
+    """Run steps over partitions in a process pool and combine the results.
+
+    parts are zero-argument callables returning one partition each; with
+    renumber=True each one is indexed from 0 and gets shifted past the rows
+    of the partitions before it. The leading row-local steps run in the
+    workers, and so does the first phase of a following group_by (partial
+    aggregates) or sort_rows (sorted runs, which the parent merges). The
+    parent combines them and runs whatever steps are left.
+    """
+    row_steps, rest = stream.split(steps)
+    final = None
+    if rest and rest[0].op == "sort_rows":
+        final = rest.pop(0)
+    elif rest and rest[0].op == "group_by":
+        if stream.decomposable(rest[0].params["agg_func"]):
+            final = rest.pop(0)
+    job = (parts, row_steps, final, run)
+    with _pool(workers, _start, (job,)) as pool:
+        if isinstance(pool, ThreadPoolExecutor):
+            work = functools.partial(_run, job)
+        else:
+            work = _work
+        results, sizes = zip(*pool.map(work, range(len(parts))))
+    if renumber and (final is None or final.op == "sort_rows"):
+        offset = 0
+        for result, size in zip(results, sizes):
+            result.index = result.index + offset
+            offset += size
+    if final is None:
+        return run(pd.concat(results), rest)
+    if final.op == "sort_rows":
+        # k-way merge of the workers' sorted runs; equal keys keep
+        # partition order, as the stable sort_rows does
+        p = final.params
+        return run(spill.merge(results, p["by"], p["ascending"]), rest)
+    by, agg_func = final.params["by"], final.params["agg_func"]
+    keys = by if isinstance(by, list) else [by]
+    grouped = stream.finish(stream.combine(results, keys), agg_func)
+    return run(grouped, rest)
+
+
+def gather(function, items, executor="thread", workers=None):
+    """[function(item) for item in items], run in a "thread" or "process"
+    pool of workers (the CPU count by default)."""
+    if executor == "process":
+        pool = _pool(workers)
+    elif executor == "thread":
+        pool = ThreadPoolExecutor(workers)
+    else:
+        raise ValueError(f"unknown executor={executor!r}")
+    with pool:
+        return list(pool.map(function, items))
+
+
+def _pool(workers, initializer=None, initargs=()):
+    # without fork it's threads, which would all share one _job, so the
+    # initializer is only given to processes
+    if "fork" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("fork")
+        return ProcessPoolExecutor(
+            workers,
+            mp_context=context,
+            initializer=initializer,
+            initargs=initargs,
+        )
+    return ThreadPoolExecutor(workers)
+
+
+def _start(job):
+    global _job
+    _job = job
+
+
+def _work(index):
+    return _run(_job, index)
+
+
+def _run(job, index):
+    parts, row_steps, final, run = job
+    dataframe = parts[index]()
+    size = len(dataframe)
+    dataframe = run(dataframe, row_steps)
+    if final is None:
+        return dataframe, size
+    if final.op == "sort_rows":
+        return run(dataframe, [final]), size
+    by, agg_func = final.params["by"], final.params["agg_func"]
+    return stream.partial_agg(dataframe, by, agg_func), size
@@ -0,0 +1,598 @@
+import functools
+import inspect
+import warnings
+
+import numpy as np
+import pandas as pd
+import sqlalchemy
+
+from wells import expr
+from wells import loader
+from wells import parallel
+
+# steps that touch each row independently and only write their target column,
+# so a filter_rows that does not read that column can run before them
+ROW_LOCAL = {
+    "add_column",
+    "fill_missing",
+    "lookup_value",
+    "change_values",
+    "change_values_conditionally",
+}
+
+
+class Step:
+    def __init__(self, op, params):
+        self.op = op
+        self.params = params
+
+    def __repr__(self):
+        args = ", ".join(f"{k}={_format(v)}" for k, v in self.params.items())
+        return f"{self.op}({args})"
+
+    def __eq__(self, other):
+        return (
+            isinstance(other, Step)
+            and self.op == other.op
+            and self.params == other.params
+        )
+
+
+class FrameScan:
+    ignore_index = False
+
+    def __init__(self, dataframe):
+        self.dataframe = dataframe
+
+    @property
+    def columns(self):
+        return list(self.dataframe.columns)
+
+    def read(self, columns=None):
+        if columns is None:
+            return self.dataframe
+        return _select(self.dataframe, columns)
+
+    def chunks(self, columns=None, chunksize=None):
+        dataframe = self.read(columns)
+        for start in range(0, max(len(dataframe), 1), chunksize):
+            yield dataframe.iloc[start : start + chunksize].copy()
+
+    def partitions(self, columns=None, count=1):
+        dataframe = self.read(columns)
+        bounds = [len(dataframe) * i // count for i in range(count + 1)]
+        return [
+            functools.partial(_rows, dataframe, start, stop)
+            for start, stop in zip(bounds, bounds[1:])
+        ]
+
+    def __repr__(self):
+        return f"frame rows={len(self.dataframe)}"
+
+
+class FileScan:
+    """A file read by reader(path, **kwargs), with convert applied to each
+    frame it returns."""
+
+    ignore_index = False
+
+    def __init__(self, reader, path, convert=None, **kwargs):
+        self.reader = reader
+        self.path = path
+        self.convert = convert
+        self.kwargs = kwargs
+        self._columns = None
+
+    @property
+    def columns(self):
+        if self._columns is None:
+            header = self.reader(self.path, nrows=0, **self.kwargs)
+            self._columns = list(header.columns)
+        return self._columns
+
+    def read(self, columns=None):
+        return self._convert(self.load(columns))
+
+    def load(self, columns=None):
+        """read() without convert."""
+        kwargs = self.kwargs
+        if columns is not None:
+            kwargs = dict(kwargs, usecols=columns)
+        dataframe = self.reader(self.path, **kwargs)
+        if columns is not None:
+            dataframe = _select(dataframe, columns)
+        return dataframe
+
+    def chunks(self, columns=None, chunksize=None):
+        kwargs = dict(self.kwargs, chunksize=chunksize)
+        if columns is not None:
+            kwargs["usecols"] = columns
+        with self.reader(self.path, **kwargs) as reader:
+            for chunk in reader:
+                if columns is not None:
+                    chunk = _select(chunk, columns)
+                yield self._convert(chunk)
+
+    def _convert(self, dataframe):
+        if self.convert is None:
+            return dataframe
+        return self.convert(dataframe)
+
+    def partitions(self, columns=None, count=1):
+        return FrameScan(self.read(columns)).partitions(count=count)
+
+    def __repr__(self):
+        return f"{self.reader.__name__} path={self.path!r}"
+
+
+class TableScan:
+    """A database table, read through loader.engine(connection_string)."""
+
+    ignore_index = False
+
+    def __init__(self, table_name, connection_string, convert=None):
+        self.table_name = table_name
+        self.connection_string = connection_string
+        self.convert = convert
+        self._columns = None
+
+    @property
+    def columns(self):
+        if self._columns is None:
+            inspector = sqlalchemy.inspect(
+                loader.engine(self.connection_string)
+            )
+            columns = inspector.get_columns(self.table_name)
+            self._columns = [c["name"] for c in columns]
+        return self._columns
+
+    def read(self, columns=None):
+        with loader.engine(self.connection_string).connect() as conn:
+            dataframe = pd.read_sql(self.query(columns), conn)
+        return self._convert(dataframe)
+
+    def chunks(self, columns=None, chunksize=None):
+        with loader.engine(self.connection_string).connect() as conn:
+            query = self.query(columns)
+            for chunk in pd.read_sql(query, conn, chunksize=chunksize):
+                yield self._convert(chunk)
+
+    def partitions(self, columns=None, count=1):
+        return FrameScan(self.read(columns)).partitions(count=count)
+
+    def query(self, columns=None):
+        names = self.columns if columns is None else columns
+        table = sqlalchemy.table(
+            self.table_name, *map(sqlalchemy.column, self.columns)
+        )
+        return sqlalchemy.select(*(table.c[name] for name in names))
+
+    def _convert(self, dataframe):
+        if self.convert is None:
+            return dataframe
+        return self.convert(dataframe)
+
+    def __repr__(self):
+        return f"table {self.table_name!r}"
+
+
+class UnreadableFileWarning(UserWarning):
+    def __init__(self, path, error):
+        self.path = path
+        self.error = error
+        super().__init__(f"skipped {path!r}: {error!r}")
+
+
+class FilesScan:
+    """Several files with the same columns, read as one frame.
+
+    scans are FileScans. The row index is renumbered across files, and
+    each file is one partition for parallel execution. With executor
+    ("thread" or "process") read() parses the files concurrently in a
+    pool of max_workers. errors="warn" or "ignore" skips files that fail
+    to read, recording (path, exception) in failures, instead of raising.
+    source_column, if set, is a categorical column of each row's path.
+    """
+
+    ignore_index = True
+
+    def __init__(
+        self,
+        scans,
+        executor=None,
+        max_workers=None,
+        errors="raise",
+        source_column=None,
+    ):
+        if errors not in ("raise", "warn", "ignore"):
+            raise ValueError(f"unknown errors={errors!r}")
+        self.scans = list(scans)
+        self.executor = executor
+        self.max_workers = max_workers
+        self.errors = errors
+        self.source_column = source_column
+        self.failures = []
+
+    @classmethod
+    def of(cls, reader, paths, convert=None, **kwargs):
+        return cls(FileScan(reader, path, convert, **kwargs) for path in paths)
+
+    @property
+    def columns(self):
+        columns = list(self.scans[0].columns)
+        if self.source_column is not None:
+            columns.append(self.source_column)
+        return columns
+
+    def read(self, columns=None):
+        file_columns = self._file_columns(columns)
+        if self.executor is None:
+            loaded = [_load(scan, file_columns) for scan in self.scans]
+        else:
+            loaded = parallel.gather(
+                functools.partial(_load, columns=file_columns),
+                self.scans,
+                self.executor,
+                self.max_workers,
+            )
+        frames, paths = [], []
+        for scan, (dataframe, error) in zip(self.scans, loaded):
+            if error is not None:
+                self._failed(scan, error)
+                continue
+            frames.append(scan._convert(dataframe))
+            paths.append(scan.path)
+        if not frames:
+            return self._empty(columns)
+        dataframe = pd.concat(frames, ignore_index=True, copy=False)
+        return self._tag(dataframe, paths, [len(f) for f in frames], columns)
+
+    def chunks(self, columns=None, chunksize=None):
+        file_columns = self._file_columns(columns)
+        offset = 0
+        for scan in self.scans:
+            try:
+                for chunk in scan.chunks(file_columns, chunksize):
+                    chunk.index = pd.RangeIndex(offset, offset + len(chunk))
+                    offset += len(chunk)
+                    yield self._tag(chunk, [scan.path], [len(chunk)], columns)
+            except Exception as e:
+                self._failed(scan, e)
+
+    def partitions(self, columns=None, count=1):
+        return [
+            functools.partial(self._read_one, scan, columns)
+            for scan in self.scans
+        ]
+
+    def _read_one(self, scan, columns):
+        dataframe, error = _load(scan, self._file_columns(columns))
+        if error is not None:
+            self._failed(scan, error)
+            return self._empty(columns)
+        dataframe = scan._convert(dataframe)
+        return self._tag(dataframe, [scan.path], [len(dataframe)], columns)
+
+    def _file_columns(self, columns):
+        if columns is None or self.source_column is None:
+            return columns
+        return [c for c in columns if c != self.source_column]
+
+    def _tag(self, dataframe, paths, sizes, columns):
+        source = self.source_column
+        if source is None or (columns is not None and source not in columns):
+            return dataframe
+        categories = pd.Index(paths).unique()
+        codes = np.repeat(categories.get_indexer(paths), sizes)
+        dataframe[source] = pd.Categorical.from_codes(codes, categories)
+        if columns is not None:
+            dataframe = _select(dataframe, columns)
+        return dataframe
+
+    def _failed(self, scan, error):
+        if self.errors == "raise":
+            raise error
+        self.failures.append((scan.path, error))
+        if self.errors == "warn":
+            warnings.warn(UnreadableFileWarning(scan.path, error))
+
+    def _empty(self, columns):
+        return pd.DataFrame(
+            columns=self.columns if columns is None else columns
+        )
+
+    def __repr__(self):
+        reader = self.scans[0].reader.__name__
+        return f"{reader} paths={[scan.path for scan in self.scans]!r}"
+
+
+def _load(scan, columns):
+    # (frame before conversion, None) or (None, the exception), so one bad
+    # file doesn't stop the others
+    try:
+        return scan.load(columns), None
+    except Exception as e:
+        return None, e
+
+
+def step(method):
+    """Record the call as a plan Step when the mapper is lazy, and in its
+    trace, if it has one, when it runs."""
+    signature = inspect.signature(method)
+
+    def params(self, args, kwargs):
+        bound = signature.bind(self, *args, **kwargs)
+        bound.apply_defaults()
+        params = dict(bound.arguments)
+        del params["self"]
+        return params
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if not self.lazy:
+            if self.trace is None:
+                return method(self, *args, **kwargs)
+            self.trace.record(
+                method.__name__,
+                params(self, args, kwargs),
+                self.df,
+                lambda: method(self, *args, **kwargs).df,
+            )
+            return self
+        self.plan.append(Step(method.__name__, params(self, args, kwargs)))
+        return self
+
+    return wrapper
+
+
+def optimize(steps, columns):
+    """Return (scan_columns, steps) for the rewritten plan.
+
+    scan_columns is None when every source column has to be read.
+    """
+    steps = _merge(list(steps))
+    steps = _push_down_filters(steps)
+    required, steps = _prune(steps)
+    if required is None:
+        return None, steps
+    scan_columns = [c for c in columns if c in required]
+    if len(scan_columns) == len(columns):
+        return None, steps
+    return scan_columns, steps
+
+
+def explain(scan, scan_columns, steps):
+    lines = [f"scan {scan!r}"]
+    if scan_columns is not None:
+        lines[0] += f" columns={scan_columns!r}"
+    lines.extend(f"  {s!r}" for s in steps)
+    return "\n".join(lines)
+
+
+def names(expression):
+    """Names read by a query/eval expression, or None if it can't be parsed."""
+    try:
+        return expr.compile(expression).columns
+    except SyntaxError:
+        return None
+
+
+def _select(dataframe, columns):
+    # reindex rather than [] so the result isn't flagged as a slice copy
+    if list(dataframe.columns) == list(columns):
+        return dataframe
+    return dataframe.reindex(columns=columns)
+
+
+def _rows(dataframe, start, stop):
+    return dataframe.iloc[start:stop].copy()
+
+
+def _as_list(columns):
+    if isinstance(columns, (list, tuple)):
+        return list(columns)
+    return [columns]
+
+
+def _format(value):
+    if callable(value):
+        return f"<{getattr(value, '__name__', type(value).__name__)}>"
+    if isinstance(value, pd.DataFrame):
+        return f"<frame rows={len(value)}>"
+    return repr(value)
+
+
+def _merge(steps):
+    merged = []
+    for s in steps:
+        previous = merged[-1] if merged else None
+        if (
+            previous is not None
+            and previous.op == s.op == "rename_columns"
+            and isinstance(previous.params["columns_mapping"], dict)
+            and isinstance(s.params["columns_mapping"], dict)
+        ):
+            mapping = _compose(
+                previous.params["columns_mapping"], s.params["columns_mapping"]
+            )
+            merged[-1] = Step("rename_columns", {"columns_mapping": mapping})
+        elif previous is not None and previous.op == s.op == "drop_columns":
+            columns = _as_list(previous.params["columns"])
+            columns += [
+                c for c in _as_list(s.params["columns"]) if c not in columns
+            ]
+            merged[-1] = Step("drop_columns", {"columns": columns})
+        else:
+            merged.append(s)
+    return merged
+
+
+def _compose(first, second):
+    # second's keys that first produces are reached through first's keys
+    produced = set(first.values())
+    mapping = {}
+    sources = [k for k in second if k not in first and k not in produced]
+    for old in list(first) + sources:
+        new = first.get(old, old)
+        new = second.get(new, new)
+        if new != old:
+            mapping[old] = new
+    return mapping
+
+
+def _writes(s):
+    if s.op == "add_column":
+        return s.params["column_name"]
+    if s.op == "fill_missing":
+        return s.params["column"]
+    return s.params.get("column_name")
+
+
+def _push_down_filters(steps):
+    steps = list(steps)
+    moved = True
+    while moved:
+        moved = False
+        for i in range(1, len(steps)):
+            before, current = steps[i - 1], steps[i]
+            if current.op != "filter_rows" or before.op not in ROW_LOCAL:
+                continue
+            read = names(current.params["condition"])
+            if read is None or _writes(before) in read:
+                continue
+            steps[i - 1], steps[i] = current, before
+            moved = True
+    return steps
+
+
+def _reads(s, required):
+    """Columns a step needs on its input to produce required, or None if
+    it may need any."""
+    p = s.params
+    if s.op == "filter_rows":
+        return names(p["condition"])
+    if s.op == "add_column":
+        if isinstance(p["function"], str):
+            return names(p["function"])
+        return None
+    if s.op == "change_values" and isinstance(p["function"], str):
+        read = names(p["function"])
+        return None if read is None else read | {p["column_name"]}
+    if s.op in ("fill_missing", "lookup_value", "change_values"):
+        return frozenset([_writes(s)])
+    if s.op == "change_values_conditionally":
+        read = names(p["condition"])
+        if isinstance(p["function"], str):
+            function = names(p["function"])
+            read = None if function is None else read and read | function
+        return None if read is None else read | {p["column_name"]}
+    if s.op == "sort_rows":
+        return frozenset(_as_list(p["by"]))
+    if s.op == "join":
+        return _join_reads(p, required)
+    return frozenset()
+
+
+def _join_reads(p, required):
+    keys = p["on"] if p["left_on"] is None else p["left_on"]
+    right = getattr(p["other"], "dataframe", p["other"])
+    if not isinstance(right, pd.DataFrame):
+        return None
+    right_keys = p["on"] if p["right_on"] is None else p["right_on"]
+    # right's column only gets suffix if left has one of the same name
+    clashing = {
+        c
+        for c in set(right.columns) - set(_as_list(right_keys))
+        if c + p["suffix"] in required
+    }
+    return frozenset(_as_list(keys)) | clashing
+
+
+def _prune(steps):
+    """Drop steps whose output is never used and work out the scan columns."""
+    required = None
+    # names later kept steps write, or None if that isn't known
+    written = set()
+    kept = []
+    for s in reversed(steps):
+        p = s.params
+        if s.op == "filter_columns":
+            columns = _as_list(p["columns"])
+            required = set(columns)
+        elif s.op == "drop_columns":
+            dropped = set(_as_list(p["columns"]))
+            if (
+                required is not None
+                and written is not None
+                and not dropped & (required | written)
+            ):
+                continue
+        elif s.op == "rename_columns":
+            mapping = p["columns_mapping"]
+            if not isinstance(mapping, dict):
+                required = None
+            elif required is not None:
+                required = _renamed_from(mapping, required)
+        elif s.op == "group_by":
+            agg = p["agg_func"]
+            if isinstance(agg, dict):
+                required = set(_as_list(p["by"])) | set(agg)
+            else:
+                required = None
+        elif s.op == "pivot":
+            if p["values"] is None:
+                required = None
+            else:
+                required = set(_as_list(p["index"])) | set(
+                    _as_list(p["values"])
+                )
+                required |= set(_as_list(p["columns"]))
+        elif s.op in ROW_LOCAL and required is not None:
+            if _writes(s) not in required:
+                continue
+            read = _reads(s, required)
+            if s.op == "add_column":
+                required.discard(_writes(s))
+            required = None if read is None else required | read
+        elif required is not None:
+            read = _reads(s, required)
+            required = None if read is None else required | read
+        kept.append(s)
+        written = _written(s, written)
+    kept.reverse()
+    return required, kept
+
+
+def _renamed_from(mapping, required):
+    """The input columns a rename by mapping turns into required."""
+    sources = {}
+    for old, new in mapping.items():
+        sources.setdefault(new, set()).add(old)
+    read = set()
+    for c in required:
+        read |= sources.get(c, set())
+        if c not in mapping:
+            read.add(c)
+    return read
+
+
+def _written(s, written):
+    """written, with the names s writes added."""
+    p = s.params
+    if s.op in ("group_by", "pivot"):
+        # they build a new frame: names written after them are new too
+        return set()
+    if written is None:
+        return None
+    if s.op == "rename_columns":
+        if not isinstance(p["columns_mapping"], dict):
+            return None
+        return written | set(p["columns_mapping"].values())
+    if s.op == "join":
+        right = getattr(p["other"], "dataframe", p["other"])
+        if not isinstance(right, pd.DataFrame):
+            return None
+        return written | set(right.columns)
+    if s.op in ROW_LOCAL:
+        return written | {_writes(s)}
+    return written
@@ -1,8 +1,28 @@
 from abc import ABC
 from abc import abstractmethod
+import asyncio
+import collections
 import functools
+import os
+import pathlib
 import time
 import sqlite3
+import threading
+
+import sqlalchemy
+
+from wells import loader
+from wells import snapshot as snapshot_
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+INDEX = (
+    "CREATE INDEX IF NOT EXISTS helo_ref_type_code "
+    "ON helo_ref (type, code, value)"
+)
 
 
 def timer(func):
@@ -18,17 +38,6 @@ def timer(func):
     return wrapper_timer
 
 
-class Memo:
-    def __init__(self, func):
-        self.func = func
-        self.memo = {}
-
-    def __call__(self, args):
-        if args not in self.memo:
-            self.memo[args] = self.func(*args)
-        return self.memo[args]
-
-
 class Lookup(ABC):
     @abstractmethod
     def is_valid(self, code):
@@ -42,56 +51,672 @@ class Lookup(ABC):
     def get_value(self, lookup: tuple):
         return {}
 
+    def get_values(self, lookups):
+        """{(type, code): value} for every pair in lookups that is found.
+
+        Backends override this to resolve the pairs in a few batched queries
+        instead of one get_value call each.
+        """
+        values = {}
+        for lookup in dict.fromkeys(lookups):
+            value = (self.get_value(lookup) or {}).get(lookup)
+            if isinstance(value, tuple):
+                value = value[0]
+            if value is not None:
+                values[lookup] = value
+        return values
+
+    def cached(self, maxsize=100_000, ttl=None, negative_ttl=None):
+        """This lookup behind a CachedLookup."""
+        return CachedLookup(self, maxsize, ttl, negative_ttl)
+
     @classmethod
     def default(cls):
-        return SqliteLookup()
+        """The lookup on data/helo_ref.db, one instance per process."""
+        return _shared_sqlite("data/helo_ref.db")
+
+    @classmethod
+    def snapshot(cls, source="data/helo_ref.db", path=None):
+        """A SnapshotLookup of the SQLite database source, kept next to it
+        unless path is given."""
+        if path is None:
+            path = f"{os.fspath(source)}.snapshot"
+        return SnapshotLookup(path, source)
 
     @classmethod
-    def redis(cls):
-        return RedisLookup()
+    def redis(cls, url="redis://localhost:6379/0"):
+        return RedisLookup(url)
 
     @classmethod
-    def mysql(cls):
-        return MySqlLookup()
+    def mysql(cls, url):
+        """A SqlLookup; any SQLAlchemy URL works."""
+        return SqlLookup(url)
 
     @classmethod
     def sqlite(cls):
-        return SqliteLookup()
+        return cls.default()
 
 
-class RedisLookup(Lookup):
+class CachedLookup(Lookup):
+    """backend, another Lookup, with its answers kept in a bounded cache.
+
+    At most maxsize answers are kept, the least recently used going first,
+    each for ttl seconds (None for as long as it stays). Codes the backend
+    doesn't have are cached too, for negative_ttl seconds (ttl by
+    default). The cache can be shared by threads; when several ask for
+    the same uncached key at once, one asks the backend and the others
+    wait for its answer. hits, misses and evictions count lookups since
+    the cache was made.
+    """
+
+    def __init__(self, backend, maxsize=100_000, ttl=None, negative_ttl=None):
+        self.backend = backend
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.negative_ttl = ttl if negative_ttl is None else negative_ttl
+        self._start()
+
+    def _start(self):
+        self.hits = self.misses = self.evictions = 0
+        self._entries = collections.OrderedDict()
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        return {
+            name: value
+            for name, value in self.__dict__.items()
+            if not name.startswith("_")
+            and name not in ("hits", "misses", "evictions")
+        }
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._start()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "size": len(self._entries),
+            "hit_rate": self.hits / lookups if lookups else None,
+        }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
     def is_valid(self, code):
-        """redis specific technical stuff"""
-        return None  # replace with result of redis call
+        return self._get(("valid", code), self.backend.is_valid)
 
     def get_code(self, value):
-        code = None  # dummy value for now
+        return self._get(("code", value), self.backend.get_code)
 
     def get_value(self, lookup):
-        value = None  # dummy value for now
-        return None
+        lookup = tuple(lookup)
+        return {lookup: self.get_values([lookup]).get(lookup)}
+
+    def get_values(self, lookups):
+        keys = [("value", pair) for pair in dict.fromkeys(lookups)]
+        found = self._get_many(keys, self.backend.get_values)
+        return {
+            pair: value
+            for (_, pair), value in found.items()
+            if value is not None
+        }
+
+    def _get(self, key, load):
+        found = self._get_many([key], lambda args: {args[0]: load(args[0])})
+        return found[key]
 
+    def _get_many(self, keys, load):
+        # load gets the uncached keys' arguments and returns {argument:
+        # answer}, leaving out arguments it has no answer for
+        results, waiting, mine = {}, {}, {}
+        now = time.monotonic()
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is not None and (entry[1] is None or entry[1] > now):
+                    self._entries.move_to_end(key)
+                    results[key] = entry[0]
+                    self.hits += 1
+                    continue
+                self.misses += 1
+                if key in self._pending:
+                    waiting[key] = self._pending[key]
+                else:
+                    mine[key] = self._pending[key] = _Pending()
+        if mine:
+            try:
+                answers = load([argument for _, argument in mine])
+            except BaseException as error:
+                self._finish(mine, error=error)
+                raise
+            answers = {
+                (kind, argument): answers.get(argument)
+                for kind, argument in mine
+            }
+            self._finish(mine, answers)
+            results.update(answers)
+        for key, pending in waiting.items():
+            results[key] = pending.wait()
+        return results
 
-class MySqlLookup(Lookup):
+    def _finish(self, mine, answers=None, error=None):
+        now = time.monotonic()
+        with self._lock:
+            for key, pending in mine.items():
+                del self._pending[key]
+                if error is not None:
+                    pending.fail(error)
+                    continue
+                value = answers[key]
+                ttl = self.ttl if value is not None else self.negative_ttl
+                expires = None if ttl is None else now + ttl
+                self._entries[key] = (value, expires)
+                self._entries.move_to_end(key)
+                pending.set(value)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+
+class _Pending:
+    # the answer to a key one thread is loading, for the others that want it
     def __init__(self):
-        pass
+        self._event = threading.Event()
+        self._error = None
+
+    def set(self, value):
+        self.value = value
+        self._event.set()
+
+    def fail(self, error):
+        self._error = error
+        self._event.set()
+
+    def wait(self):
+        self._event.wait()
+        if self._error is not None:
+            raise self._error
+        return self.value
+
+
+class AsyncLookup:
+    """async get_value, get_values, get_code and is_valid over backend, any
+    Lookup.
+
+    Keys awaited while the event loop runs one tick, or within window
+    seconds of the first, are sent to the backend together: one
+    get_values call for all the pairs (get_code and is_valid have no
+    batch form, so their keys are resolved in one call that loops over
+    them), run in executor (the loop's default thread pool for None) so
+    the loop never waits on the backend, which has to be thread-safe.
+    Each key goes to the backend once however many callers await it, and
+    a batch is sent early once it has max_batch keys. requests and
+    batches count awaited keys and backend calls.
+    """
+
+    def __init__(self, backend, window=0, max_batch=10_000, executor=None):
+        self.backend = backend
+        self.window = window
+        self.max_batch = max_batch
+        self.executor = executor
+        self.requests = self.batches = 0
+        self._pending = {}
+        self._running = set()
+
+    async def get_value(self, lookup):
+        lookup = tuple(lookup)
+        return {lookup: await self._load("value", lookup)}
+
+    async def get_values(self, lookups):
+        pairs = list(dict.fromkeys(tuple(pair) for pair in lookups))
+        # queued here rather than in tasks, so they join the current batch
+        futures = [self._queue("value", pair) for pair in pairs]
+        found = await asyncio.gather(*futures)
+        return {
+            pair: value
+            for pair, value in zip(pairs, found)
+            if value is not None
+        }
+
+    async def get_code(self, value):
+        return await self._load("code", value)
+
+    async def is_valid(self, code):
+        return await self._load("valid", code)
+
+    async def _load(self, kind, key):
+        return await self._queue(kind, key)
+
+    def _queue(self, kind, key):
+        loop = asyncio.get_running_loop()
+        self.requests += 1
+        batch = self._pending.get(kind)
+        if batch is None:
+            batch = self._pending[kind] = {}
+            if self.window:
+                loop.call_later(self.window, self._send, kind, batch)
+            else:
+                loop.call_soon(self._send, kind, batch)
+        # every caller gets its own future, so one giving up doesn't
+        # cancel the answer for the others
+        future = loop.create_future()
+        batch.setdefault(key, []).append(future)
+        if len(batch) >= self.max_batch:
+            self._send(kind, batch)
+        return future
+
+    def _send(self, kind, batch):
+        if self._pending.get(kind) is not batch:
+            return
+        del self._pending[kind]
+        task = asyncio.ensure_future(self._resolve(kind, batch))
+        self._running.add(task)
+        task.add_done_callback(self._running.discard)
+
+    async def _resolve(self, kind, batch):
+        loop = asyncio.get_running_loop()
+        self.batches += 1
+        try:
+            answers = await loop.run_in_executor(
+                self.executor, self._call, kind, list(batch)
+            )
+        except Exception as error:
+            for futures in batch.values():
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(error)
+            return
+        for key, futures in batch.items():
+            answer = answers.get(key)
+            for future in futures:
+                if not future.done():
+                    future.set_result(answer)
+
+    def _call(self, kind, keys):
+        if kind == "value":
+            return self.backend.get_values(keys)
+        method = (
+            self.backend.get_code if kind == "code" else self.backend.is_valid
+        )
+        return {key: method(key) for key in keys}
+
+
+class RedisLookup(Lookup):
+    """Reference data in Redis, one string key per (type, code).
+
+    Keys are prefix + "type\\x1fcode" and values the value as UTF-8, as
+    load() and write() store them; with codes=True they also store
+    prefix + "\\x1e" + value keys holding "type\\x1fcode", for get_code.
+    Connections come from one pool shared by the threads using the
+    lookup (redis-py opens a new one in forked children, and the lookup
+    pickles as its url), and get_values sends its MGETs, BATCH keys each,
+    in one pipelined round trip. client, a redis-py client or anything
+    with the same methods, is used instead of connecting to url.
+    """
+
+    # keys per MGET, and rows per pipelined round trip when writing
+    BATCH = 10_000
+    # keys per MSET when writing
+    WRITE_BATCH = 1_000
+
+    def __init__(
+        self,
+        url="redis://localhost:6379/0",
+        prefix="ref:",
+        max_connections=None,
+        client=None,
+    ):
+        self.url = url
+        self.prefix = prefix
+        self.max_connections = max_connections
+        if client is None:
+            if redis is None:
+                raise ImportError(
+                    'RedisLookup needs redis: pip install "wells[redis]"'
+                )
+            pool = redis.ConnectionPool.from_url(
+                url, max_connections=max_connections
+            )
+            client = redis.Redis(connection_pool=pool)
+        self.client = client
+
+    def __getstate__(self):
+        return {
+            "url": self.url,
+            "prefix": self.prefix,
+            "max_connections": self.max_connections,
+        }
+
+    def __setstate__(self, state):
+        self.__init__(**state)
 
     def is_valid(self, code):
-        """mysql specific technical stuff"""
-        return True == True  # replace with result of mysql call
+        """Whether code, a (type, code) pair, is stored."""
+        return self.client.exists(self._key(*code)) > 0
 
     def get_code(self, value):
-        code = None  # dummy value for now
+        """The (type, code) pair stored for value by write(codes=True),
+        or None."""
+        found = self.client.get(self._code_key(value))
+        if found is None:
+            return None
+        return tuple(_text(found).split("\x1f", 1))
 
-    def get_value(self, lookup: tuple):
-        value = None  # dummy value for now
-        return value
+    def get_value(self, lookup):
+        type, code = lookup
+        found = self.client.get(self._key(type, code))
+        return {(type, code): None if found is None else _text(found)}
+
+    def get_values(self, lookups):
+        pairs = list(dict.fromkeys(lookups))
+        if not pairs:
+            return {}
+        starts = range(0, len(pairs), self.BATCH)
+        pipe = self.client.pipeline(transaction=False)
+        for start in starts:
+            batch = pairs[start : start + self.BATCH]
+            pipe.mget([self._key(*pair) for pair in batch])
+        values = {}
+        for start, found in zip(starts, pipe.execute()):
+            for pair, value in zip(pairs[start : start + self.BATCH], found):
+                if value is not None:
+                    values[pair] = _text(value)
+        return values
+
+    def load(self, database="data/helo_ref.db", table="helo_ref", codes=False):
+        """Copy table from the SQLite database into Redis with write()."""
+        uri = pathlib.Path(database).absolute().as_uri() + "?mode=ro"
+        con = sqlite3.connect(uri, uri=True)
+        try:
+            rows = con.execute(f"SELECT type, code, value FROM {table}")
+            return self.write(rows, codes)
+        finally:
+            con.close()
+
+    def write(self, rows, codes=False):
+        """Store (type, code, value) rows, BATCH per pipelined round trip
+        of MSETs, and return how many were stored. Rows without a value
+        are left out, and a later row for the same key replaces it."""
+        written = 0
+        pipe = self.client.pipeline(transaction=False)
+        mapping, queued = {}, 0
+        for type, code, value in rows:
+            if value is None:
+                continue
+            mapping[self._key(type, code)] = str(value)
+            if codes:
+                mapping[self._code_key(value)] = f"{type}\x1f{code}"
+            written += 1
+            if len(mapping) >= self.WRITE_BATCH:
+                pipe.mset(mapping)
+                queued += len(mapping)
+                mapping = {}
+                if queued >= self.BATCH:
+                    pipe.execute()
+                    queued = 0
+        if mapping:
+            pipe.mset(mapping)
+        pipe.execute()
+        return written
+
+    def _key(self, type, code):
+        return f"{self.prefix}{type}\x1f{code}"
+
+    def _code_key(self, value):
+        return f"{self.prefix}\x1e{value}"
+
+
+class SqlLookup(Lookup):
+    """Reference data in a table of any database SQLAlchemy can reach, by
+    URL: MySQL or Postgres in production, a SQLite file (a bare path
+    works) in tests.
+
+    The engine's connection pool, shared by the threads using the lookup,
+    checks each connection before handing it out (pool_pre_ping), and a
+    forked child leaves its parent's connections alone; engine_kwargs go
+    to create_engine (pool_size, max_overflow, pool_recycle, ...). The
+    statements are built once, so SQLAlchemy compiles each once and reuses
+    it. get_values sends one IN query per type for every BATCH codes, and
+    items() streams the whole table. stats() reports the pool and how
+    long the queries took.
+    """
+
+    BATCH = 1_000
+
+    def __init__(self, url, table="helo_ref", **engine_kwargs):
+        self.url = loader.url(url)
+        self.table = table
+        self.engine_kwargs = engine_kwargs
+        self._start()
+
+    def _start(self):
+        self.engine = sqlalchemy.create_engine(
+            self.url, pool_pre_ping=True, **self.engine_kwargs
+        )
+        table = sqlalchemy.Table(
+            self.table,
+            sqlalchemy.MetaData(),
+            sqlalchemy.Column("type", sqlalchemy.String),
+            sqlalchemy.Column("code", sqlalchemy.String),
+            sqlalchemy.Column("value", sqlalchemy.String),
+        )
+        type_, code, value = table.c.type, table.c.code, table.c.value
+        self._value = (
+            sqlalchemy.select(value)
+            .where(type_ == sqlalchemy.bindparam("type"))
+            .where(code == sqlalchemy.bindparam("code"))
+            .limit(1)
+        )
+        self._values = (
+            sqlalchemy.select(code, value)
+            .where(type_ == sqlalchemy.bindparam("type"))
+            .where(code.in_(sqlalchemy.bindparam("codes", expanding=True)))
+        )
+        self._code = (
+            sqlalchemy.select(type_, code)
+            .where(value == sqlalchemy.bindparam("value"))
+            .limit(1)
+        )
+        self._all = sqlalchemy.select(type_, code, value)
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        self._queries = 0
+        self._seconds = self._slowest = 0.0
+
+    def __getstate__(self):
+        return {
+            "url": self.url,
+            "table": self.table,
+            "engine_kwargs": self.engine_kwargs,
+        }
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._start()
+
+    def close(self):
+        self.engine.dispose()
+
+    def stats(self):
+        """Query count and latency, and the pool's connections."""
+        with self._lock:
+            queries, seconds = self._queries, self._seconds
+            slowest = self._slowest
+        pool = self.engine.pool
+        return {
+            "queries": queries,
+            "mean_ms": 1000 * seconds / queries if queries else None,
+            "max_ms": 1000 * slowest,
+            "pool": {
+                name: getattr(pool, name)()
+                for name in ("size", "checkedin", "checkedout", "overflow")
+                if hasattr(pool, name)
+            },
+        }
+
+    def is_valid(self, code):
+        """Whether code, a (type, code) pair, is in the table."""
+        type, code = code
+        return self.get_value((type, code))[(type, code)] is not None
+
+    def get_code(self, value):
+        """The (type, code) pair of a row with value, or None."""
+        with self._connect() as con:
+            rows = self._run(con, self._code, {"value": value})
+        return tuple(rows[0]) if rows else None
+
+    def get_value(self, lookup):
+        type, code = lookup
+        with self._connect() as con:
+            rows = self._run(con, self._value, {"type": type, "code": code})
+        return {(type, code): rows[0][0] if rows else None}
+
+    def get_values(self, lookups):
+        codes = collections.defaultdict(list)
+        for type, code in dict.fromkeys(lookups):
+            codes[type].append(code)
+        values = {}
+        with self._connect() as con:
+            for type, type_codes in codes.items():
+                for start in range(0, len(type_codes), self.BATCH):
+                    batch = type_codes[start : start + self.BATCH]
+                    rows = self._run(
+                        con, self._values, {"type": type, "codes": batch}
+                    )
+                    for code, value in rows:
+                        if value is not None:
+                            values[(type, code)] = value
+        return values
+
+    def items(self, batch=10_000):
+        """Every (type, code, value) row, fetched batch rows at a time
+        (through a server-side cursor where the driver has one)."""
+        with self._connect() as con:
+            start = time.perf_counter()
+            result = con.execution_options(yield_per=batch).execute(self._all)
+            for row in result:
+                yield tuple(row)
+            self._timed(start)
+
+    def _connect(self):
+        if self._pid != os.getpid():
+            # the pool's connections belong to the parent process
+            self.engine.dispose(close=False)
+            self._pid = os.getpid()
+        return self.engine.connect()
+
+    def _run(self, con, statement, params):
+        start = time.perf_counter()
+        rows = con.execute(statement, params).all()
+        self._timed(start)
+        return rows
+
+    def _timed(self, start):
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self._queries += 1
+            self._seconds += elapsed
+            self._slowest = max(self._slowest, elapsed)
 
 
 class SqliteLookup(Lookup):
-    def __init__(self):
-        self.con = sqlite3.connect("data/helo_ref.db")
-        self.cur = self.con.cursor()
+    """Reference data in a SQLite database, opened read-only.
+
+    Every thread gets its own connection, opened on first use and kept for
+    the thread's lifetime, so one instance can be shared by a thread pool
+    without locking, and instances pickle to process pools as their path.
+    A forked child opens fresh connections rather than reuse its parent's.
+    cache_size and mmap_size are the bytes of page cache and of memory
+    mapped file each connection may use. A writable database is switched
+    to WAL (wal=True) and gets an index on helo_ref (type, code) if it has
+    none (index=True).
+    """
+
+    # pairs per query, two parameters each, fewer if SQLite's variable
+    # limit is lower
+    BATCH = 16_000
+
+    def __init__(
+        self,
+        path="data/helo_ref.db",
+        cache_size=64 * 2**20,
+        mmap_size=256 * 2**20,
+        wal=True,
+        index=True,
+    ):
+        self.path = os.fspath(path)
+        self.cache_size = cache_size
+        self.mmap_size = mmap_size
+        self.wal = wal
+        self.index = index
+        self._start()
+
+    def _start(self):
+        self._uri = pathlib.Path(self.path).absolute().as_uri() + "?mode=ro"
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = {}
+        self._pid = os.getpid()
+        if self.wal or self.index:
+            _prepare(self.path, self.wal, self.index)
+
+    def __getstate__(self):
+        return {
+            name: value
+            for name, value in self.__dict__.items()
+            if not name.startswith("_")
+        }
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @property
+    def con(self):
+        """This thread's connection."""
+        if self._pid != os.getpid():
+            self._start()
+        con = getattr(self._local, "con", None)
+        if con is None:
+            # check_same_thread=False only so close() can close it from
+            # another thread
+            con = sqlite3.connect(self._uri, uri=True, check_same_thread=False)
+            con.execute(f"PRAGMA cache_size = {-(self.cache_size // 1024)}")
+            con.execute(f"PRAGMA mmap_size = {int(self.mmap_size)}")
+            con.execute("PRAGMA query_only = 1")
+            self._local.con = con
+            with self._lock:
+                # a pool's replaced threads leave their connections behind
+                for thread, old in list(self._connections.items()):
+                    if not thread.is_alive():
+                        old.close()
+                        del self._connections[thread]
+                self._connections[threading.current_thread()] = con
+        return con
+
+    def close(self):
+        """Close every thread's connection; threads that use the lookup
+        again reopen theirs."""
+        with self._lock:
+            connections, self._connections = self._connections, {}
+            self._local = threading.local()
+        for con in connections.values():
+            con.close()
 
     def is_valid(self, code):
         return True == True
@@ -101,12 +726,166 @@ class SqliteLookup(Lookup):
 
     def get_value(self, lookup: tuple):
         type, code = lookup
-        result = self.cur.execute(
-            f"SELECT value FROM helo_ref where type='{type}' and code='{code}';"
+        result = self.con.execute(
+            "SELECT value FROM helo_ref WHERE type = ? AND code = ?",
+            (type, code),
         )
         ref_data = result.fetchone()
         return {(type, code): ref_data}
 
+    def get_values(self, lookups):
+        """Resolve the pairs BATCH at a time, each batch in one query that
+        joins them as a VALUES list to the (type, code) index."""
+        pairs = list(dict.fromkeys(lookups))
+        con = self.con
+        limit = con.getlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER)
+        size = min(self.BATCH, limit // 2)
+        values = {}
+        for start in range(0, len(pairs), size):
+            batch = pairs[start : start + size]
+            rows = ", ".join(["(?, ?)"] * len(batch))
+            result = con.execute(
+                "SELECT h.type, h.code, h.value "
+                f"FROM (VALUES {rows}) AS k JOIN helo_ref AS h "
+                "ON h.type = k.column1 AND h.code = k.column2",
+                [part for pair in batch for part in pair],
+            )
+            for type, code, value in result:
+                values[(type, code)] = value
+        return values
+
+
+class SnapshotLookup(Lookup):
+    """Reference data from a snapshot file (see wells.snapshot).
+
+    The file is memory-mapped, so the processes using it share one copy,
+    and get_values resolves a batch of pairs with one vectorized binary
+    search; for many single-key calls, put a CachedLookup in front. With
+    source, the SQLite database the snapshot is of, the snapshot is
+    rebuilt whenever it falls behind the database. Every check_interval
+    seconds the lookup checks whether the file was replaced (or, with
+    source, is stale) and swaps the new one in whole.
+    """
+
+    def __init__(self, path, source=None, check_interval=1.0):
+        self.path = os.fspath(path)
+        self.source = None if source is None else os.fspath(source)
+        self.check_interval = check_interval
+        self._start()
+
+    def _start(self):
+        self._lock = threading.Lock()
+        self._reverse = None
+        self._snapshot = None
+        self._checked = time.monotonic()
+        self._refresh()
+
+    def __getstate__(self):
+        return {
+            name: value
+            for name, value in self.__dict__.items()
+            if not name.startswith("_")
+        }
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._start()
+
+    def __len__(self):
+        return len(self.snapshot)
+
+    @property
+    def snapshot(self):
+        """The current snapshot.Snapshot."""
+        now = time.monotonic()
+        if now - self._checked >= self.check_interval:
+            self._checked = now
+            self._refresh()
+        return self._snapshot
+
+    def _refresh(self):
+        with self._lock:
+            if self.source is not None:
+                current = snapshot_.source_stamp(self.source)
+                if snapshot_.read_stamp(self.path) != current:
+                    snapshot_.build(self.source, self.path)
+            old = self._snapshot
+            try:
+                identity = snapshot_.identity(self.path)
+            except FileNotFoundError:
+                if old is not None:
+                    return
+                raise
+            if old is None or old.identity != identity:
+                self._snapshot = snapshot_.Snapshot(self.path)
+                self._reverse = None
+
+    def is_valid(self, code):
+        """Whether code, a (type, code) pair, is in the snapshot."""
+        type, code = code
+        return self.snapshot.get(type, code) is not None
+
+    def get_code(self, value):
+        """The first (type, code) pair whose value is value, or None."""
+        current = self.snapshot
+        reverse = self._reverse
+        if reverse is None or reverse[0] is not current:
+            codes = {}
+            for pair, found in current.items():
+                codes.setdefault(found, pair)
+            reverse = self._reverse = (current, codes)
+        return reverse[1].get(value)
+
+    def get_value(self, lookup):
+        type, code = lookup
+        return {(type, code): self.snapshot.get(type, code)}
+
+    def get_values(self, lookups):
+        return self.snapshot.get_many(dict.fromkeys(lookups))
+
+
+def _text(value):
+    return value.decode() if isinstance(value, bytes) else value
+
+
+@functools.lru_cache(maxsize=None)
+def _shared_sqlite(path):
+    return SqliteLookup(path)
+
+
+def _prepare(path, wal, index):
+    # WAL lets readers run alongside a writer refreshing the data, and the
+    # index makes every lookup a search of one covering index. Both are
+    # stored in the file, so this only changes it once; a read-only file
+    # or directory is left as it is.
+    try:
+        con = sqlite3.connect(
+            pathlib.Path(path).absolute().as_uri() + "?mode=rw", uri=True
+        )
+    except sqlite3.OperationalError:
+        return
+    try:
+        if wal and con.execute("PRAGMA journal_mode").fetchone()[0] != "wal":
+            con.execute("PRAGMA journal_mode = WAL")
+        if index and not _indexed(con):
+            con.execute(INDEX)
+            con.commit()
+    except sqlite3.OperationalError:
+        pass
+    finally:
+        con.close()
+
+
+def _indexed(con):
+    for _, name, _, _, partial in con.execute("PRAGMA index_list(helo_ref)"):
+        columns = [
+            column
+            for _, _, column in con.execute(f"PRAGMA index_info('{name}')")
+        ]
+        if not partial and columns[:2] == ["type", "code"]:
+            return True
+    return False
+
 
 if __name__ == "__main__":
     l = Lookup.default()
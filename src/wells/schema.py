@@ -0,0 +1,107 @@
+import numpy as np
+import pandas as pd
+
+from wells import arrow as arrow_
+
+DATES = ("date", "datetime", "datetime64", "datetime64[ns]")
+
+
+def memory(dataframe):
+    return int(dataframe.memory_usage(deep=True).sum())
+
+
+def reader_kwargs(schema):
+    """read_csv/read_excel arguments that read only the schema's columns
+    and parse its date columns while reading."""
+    if not schema:
+        return {}
+    dates = [c for c, dtype in schema.items() if dtype in DATES]
+    kwargs = {"usecols": list(schema)}
+    if dates:
+        kwargs["parse_dates"] = dates
+    return kwargs
+
+
+class Converter:
+    """Apply a schema ({column: dtype}) to frames as they are read and, with
+    optimize=True, shrink the remaining columns too. arrow=True then
+    converts every column to an Arrow-backed dtype (see wells.arrow).
+
+    report accumulates the memory of every frame before and after.
+    """
+
+    def __init__(
+        self, schema=None, optimize=False, threshold=0.5, arrow=False
+    ):
+        if arrow:
+            arrow_.require()
+        self.schema = schema or {}
+        self.optimize = optimize
+        self.threshold = threshold
+        self.arrow = arrow
+        self.report = {"before": 0, "after": 0}
+
+    def __call__(self, dataframe):
+        self.report["before"] += memory(dataframe)
+        for column in dataframe.columns:
+            if column in self.schema:
+                dtype = self.schema[column]
+                dataframe[column] = convert(dataframe[column], dtype)
+            elif self.optimize:
+                dataframe[column] = compact(dataframe[column], self.threshold)
+        if self.arrow:
+            dataframe = arrow_.from_pandas(dataframe)
+        self.report["after"] += memory(dataframe)
+        return dataframe
+
+
+def convert(series, dtype):
+    if dtype in DATES:
+        return pd.to_datetime(series)
+    return series.astype(dtype)
+
+
+def compact(series, threshold=0.5):
+    """Smallest safe dtype for series.
+
+    Integers go down to int32 at the smallest (so derived arithmetic has
+    headroom), floats to float32 only where no value changes, and string
+    columns with at most threshold distinct values per row become
+    categoricals.
+    """
+    dtype = series.dtype
+    if not isinstance(dtype, np.dtype) or len(series) == 0:
+        return series
+    if dtype.kind == "i" and dtype.itemsize > 4:
+        info = np.iinfo(np.int32)
+        if series.min() >= info.min and series.max() <= info.max:
+            return series.astype(np.int32)
+    elif dtype.kind == "f" and dtype.itemsize > 4:
+        narrow = series.astype(np.float32)
+        same = (narrow.astype(dtype) == series) | series.isna()
+        if same.all():
+            return narrow
+    elif dtype == object:
+        if pd.api.types.infer_dtype(series, skipna=True) == "string":
+            if series.nunique() <= threshold * len(series):
+                return series.astype("category")
+    return series
+
+
+def allow(dataframe, column, values):
+    """Add values to the categories of column if it is categorical, so
+    they can be assigned to it."""
+    series = dataframe[column]
+    if not isinstance(series.dtype, pd.CategoricalDtype):
+        return
+    values = pd.Series(values).dropna().unique()
+    new = [v for v in values if v not in series.cat.categories]
+    if not new:
+        return
+    series = series.cat.add_categories(new)
+    try:
+        categories = series.cat.categories.sort_values()
+        series = series.cat.reorder_categories(categories)
+    except TypeError:
+        pass
+    dataframe[column] = series
@@ -0,0 +1,189 @@
+"""Reference data snapshots: a whole helo_ref table in one immutable file,
+memory-mapped by every process that reads it so they share its pages.
+
+The file holds a header, the keys ("type\\x1fcode" in UTF-8) sorted and
+NUL-padded to one width, count + 1 int64 offsets of each key's value, and
+the values (UTF-8) back to back, so opening one costs a header read and
+finding a key a binary search. Files are only ever replaced whole, with
+os.replace, so a reader sees the old snapshot or the new one.
+"""
+
+import hashlib
+import itertools
+import mmap
+import os
+import pathlib
+import sqlite3
+import struct
+import tempfile
+
+import numpy as np
+
+MAGIC = b"WELLSREF"
+VERSION = 1
+# magic, version, key width, count, source stamp
+HEADER = struct.Struct("<8sIIQQ")
+SEPARATOR = "\x1f"
+
+
+class Snapshot:
+    """A snapshot file, opened read-only."""
+
+    def __init__(self, path):
+        self.path = os.fspath(path)
+        with open(self.path, "rb") as f:
+            self.identity = _identity(os.fstat(f.fileno()))
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, width, count, self.stamp = HEADER.unpack_from(
+            self._map
+        )
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(
+                f"{self.path} is not a version {VERSION} snapshot"
+            )
+        self.keys = np.frombuffer(
+            self._map, dtype=f"S{width}", count=count, offset=HEADER.size
+        )
+        start = _aligned(HEADER.size + width * count)
+        self.offsets = np.frombuffer(
+            self._map, dtype="<i8", count=count + 1, offset=start
+        )
+        self._values = start + 8 * (count + 1)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def get(self, type, code):
+        """The value for (type, code), or None."""
+        key = _key(type, code)
+        if len(key) > self.keys.dtype.itemsize:
+            return None
+        # probing with the keys' own dtype keeps numpy from converting them
+        key = np.array(key, dtype=self.keys.dtype)
+        i = int(self.keys.searchsorted(key))
+        if i < len(self.keys) and self.keys[i] == key:
+            return self._value(i)
+        return None
+
+    def get_many(self, pairs):
+        """{(type, code): value} for the pairs that are in the snapshot."""
+        width = self.keys.dtype.itemsize
+        keys = {}
+        for pair in pairs:
+            key = _key(*pair)
+            if len(key) <= width:
+                keys[pair] = key
+        if not keys or not len(self.keys):
+            return {}
+        probes = np.array(list(keys.values()), dtype=self.keys.dtype)
+        rows = self.keys.searchsorted(probes)
+        found = rows < len(self.keys)
+        found[found] = self.keys[rows[found]] == probes[found]
+        rows = rows[found]
+        starts = (self.offsets[rows] + self._values).tolist()
+        ends = (self.offsets[rows + 1] + self._values).tolist()
+        data = self._map
+        return {
+            pair: data[start:end].decode()
+            for pair, start, end in zip(
+                itertools.compress(keys, found), starts, ends
+            )
+        }
+
+    def items(self):
+        for i, key in enumerate(self.keys):
+            yield tuple(key.decode().split(SEPARATOR, 1)), self._value(i)
+
+    def _value(self, i):
+        start, end = self.offsets[i], self.offsets[i + 1]
+        return self._map[self._values + start : self._values + end].decode()
+
+
+def build(database, path, table="helo_ref"):
+    """Write the snapshot of table in the SQLite database to path."""
+    uri = pathlib.Path(database).absolute().as_uri() + "?mode=ro"
+    con = sqlite3.connect(uri, uri=True)
+    try:
+        # the stamp is taken first, so a change made while reading makes
+        # the snapshot stale rather than look current
+        stamp = source_stamp(database)
+        rows = con.execute(f"SELECT type, code, value FROM {table}")
+        write(rows, path, stamp)
+    finally:
+        con.close()
+
+
+def write(rows, path, stamp=0):
+    """Write (type, code, value) rows to path, replacing it atomically.
+    Rows without a value are left out and the first value for a key
+    wins; values are stored as strings."""
+    values = {}
+    for type, code, value in rows:
+        if value is not None:
+            values.setdefault(_key(type, code), str(value).encode())
+    keys = np.sort(np.array(list(values), dtype=bytes))
+    width = max(keys.dtype.itemsize, 1)
+    keys = keys.astype(f"S{width}")
+    blobs = [values[key] for key in keys]
+    offsets = np.zeros(len(blobs) + 1, dtype="<i8")
+    np.cumsum([len(blob) for blob in blobs], out=offsets[1:])
+    header = HEADER.pack(MAGIC, VERSION, width, len(keys), stamp)
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temporary = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(header)
+            f.write(keys.tobytes())
+            f.write(bytes(_aligned(f.tell()) - f.tell()))
+            f.write(offsets.tobytes())
+            f.write(b"".join(blobs))
+        os.replace(temporary, path)
+    except BaseException:
+        os.unlink(temporary)
+        raise
+
+
+def source_stamp(database):
+    """A number that changes whenever the SQLite database does, counting
+    changes still in its write-ahead log."""
+    parts = []
+    for path in (database, f"{database}-wal"):
+        try:
+            parts.append(_identity(os.stat(path)))
+        except FileNotFoundError:
+            parts.append(None)
+    digest = hashlib.blake2b(repr(parts).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+def read_stamp(path):
+    """The source stamp the snapshot at path was built with, or None if
+    there is no snapshot there."""
+    try:
+        with open(path, "rb") as f:
+            header = f.read(HEADER.size)
+    except FileNotFoundError:
+        return None
+    if len(header) < HEADER.size:
+        return None
+    magic, version, _, _, stamp = HEADER.unpack(header)
+    if magic != MAGIC or version != VERSION:
+        return None
+    return stamp
+
+
+def identity(path):
+    """What changes when the file at path is replaced or rewritten."""
+    return _identity(os.stat(path))
+
+
+def _identity(stat):
+    return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+
+def _key(type, code):
+    return f"{type}{SEPARATOR}{code}".encode()
+
+
+def _aligned(offset):
+    return (offset + 7) // 8 * 8
@@ -0,0 +1,208 @@
+"""sort_rows and group_by over more rows than fit in memory.
+
+Both take an iterable of frames and a memory budget in bytes, and yield
+their result in chunks. While the input fits in the budget everything
+stays in memory. Past it, sort writes sorted runs to temporary files and
+k-way merges them, and group_by hash-partitions rows (or, for the
+aggregations stream can combine, partial aggregates) into files and
+aggregates one partition at a time.
+"""
+
+import functools
+import os
+import pickle
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from wells import stream
+from wells.schema import memory
+
+# the merge reads one block of every run at a time, so runs are written
+# in blocks of about memory_limit / FAN_IN bytes, but at least MIN_BLOCK
+# rows so a small limit doesn't make the merge crawl
+FAN_IN = 16
+MIN_BLOCK = 1024
+
+PARTITIONS = 32
+
+
+class SpillFile:
+    """Frames appended to a file and read back in the same order."""
+
+    def __init__(self, directory):
+        fd, self.path = tempfile.mkstemp(dir=directory, suffix=".pkl")
+        os.close(fd)
+
+    def write(self, dataframe):
+        with open(self.path, "ab") as f:
+            pickle.dump(dataframe, f, pickle.HIGHEST_PROTOCOL)
+
+    def frames(self):
+        with open(self.path, "rb") as f:
+            while True:
+                try:
+                    yield pickle.load(f)
+                except EOFError:
+                    return
+
+
+def sort(chunks, by, ascending, memory_limit, directory=None):
+    """Yield the rows of chunks sorted by by, stable like sort_rows."""
+    keys, ascending = _keys(by, ascending)
+    with tempfile.TemporaryDirectory(dir=directory) as spill_directory:
+        write_run = functools.partial(
+            _write_run,
+            keys=keys,
+            ascending=ascending,
+            memory_limit=memory_limit,
+            directory=spill_directory,
+        )
+        runs, buffer, size = [], [], 0
+        for chunk in chunks:
+            buffer.append(chunk)
+            size += memory(chunk)
+            if size > memory_limit:
+                runs.append(write_run(buffer, size))
+                buffer, size = [], 0
+        if not runs:
+            if buffer:
+                yield _sorted(pd.concat(buffer), keys, ascending)
+            return
+        if buffer:
+            runs.append(write_run(buffer, size))
+        yield from _merge([run.frames() for run in runs], keys, ascending)
+
+
+def group_by(chunks, by, agg_func, memory_limit, directory=None):
+    """Yield groupby(by).agg(agg_func).reset_index() of chunks, in key
+    order."""
+    keys = by if isinstance(by, list) else [by]
+    partial = stream.decomposable(agg_func)
+    with tempfile.TemporaryDirectory(dir=directory) as spill_directory:
+        pending, size, partitions = [], 0, None
+        for chunk in chunks:
+            if partial:
+                chunk = stream.partial_agg(chunk, by, agg_func)
+                if pending:
+                    chunk = stream.combine(pending + [chunk], keys)
+                pending, size = [chunk], memory(chunk)
+            else:
+                pending.append(chunk)
+                size += memory(chunk)
+            if size > memory_limit:
+                if partitions is None:
+                    partitions = [
+                        SpillFile(spill_directory) for _ in range(PARTITIONS)
+                    ]
+                for dataframe in pending:
+                    _partition(dataframe, keys, partitions, partial)
+                pending, size = [], 0
+        if partitions is None:
+            if pending:
+                yield _aggregate(pending, by, keys, agg_func, partial)
+            return
+        for dataframe in pending:
+            _partition(dataframe, keys, partitions, partial)
+        groups = (
+            _aggregate(frames, by, keys, agg_func, partial)
+            for frames in (list(p.frames()) for p in partitions)
+            if frames
+        )
+        # each partition is in key order, but they interleave
+        offset = 0
+        for chunk in sort(groups, keys, True, memory_limit, spill_directory):
+            chunk.index = pd.RangeIndex(offset, offset + len(chunk))
+            offset += len(chunk)
+            yield chunk
+
+
+def merge(frames, by, ascending):
+    """frames, each already sorted by by, merged into one sorted frame;
+    rows with equal keys keep the order of frames. Only the key columns
+    go through the merge, at most one round per frame, and the rows are
+    then taken once in merged order."""
+    keys, ascending = _keys(by, ascending)
+    combined = pd.concat(frames)
+    positions = combined[keys].reset_index(drop=True)
+    bounds = np.cumsum([0] + [len(f) for f in frames])
+    readers = [
+        iter([positions.iloc[start:stop]])
+        for start, stop in zip(bounds, bounds[1:])
+    ]
+    merged = [m.index.to_numpy() for m in _merge(readers, keys, ascending)]
+    if not merged:
+        return combined
+    return combined.iloc[np.concatenate(merged)]
+
+
+def _keys(by, ascending):
+    keys = by if isinstance(by, list) else [by]
+    if isinstance(ascending, bool):
+        ascending = [ascending] * len(keys)
+    return keys, list(ascending)
+
+
+def _sorted(dataframe, keys, ascending):
+    return dataframe.sort_values(by=keys, ascending=ascending, kind="stable")
+
+
+def _write_run(buffer, size, keys, ascending, memory_limit, directory):
+    dataframe = _sorted(pd.concat(buffer), keys, ascending)
+    block = int(len(dataframe) * memory_limit / FAN_IN / size)
+    block = max(block, MIN_BLOCK)
+    run = SpillFile(directory)
+    for start in range(0, len(dataframe), block):
+        run.write(dataframe.iloc[start : start + block])
+    return run
+
+
+def _merge(readers, keys, ascending):
+    # readers yield the blocks of each sorted run. Each round stably sorts
+    # the keys of the current block of every run, concatenated in run
+    # order so equal keys keep their input order, and emits everything up
+    # to the first row that ends a block: no row still to be read can
+    # sort before it.
+    blocks = [next(reader, None) for reader in readers]
+    while True:
+        for i, reader in enumerate(readers):
+            while blocks[i] is not None and len(blocks[i]) == 0:
+                blocks[i] = next(reader, None)
+        live = [i for i, block in enumerate(blocks) if block is not None]
+        if not live:
+            return
+        sizes = np.array([len(blocks[i]) for i in live])
+        combined = pd.concat([blocks[i] for i in live])
+        order = (
+            combined[keys]
+            .reset_index(drop=True)
+            .sort_values(by=keys, ascending=ascending, kind="stable")
+            .index.to_numpy()
+        )
+        last = np.zeros(len(combined), dtype=bool)
+        last[np.cumsum(sizes) - 1] = True
+        stop = int(np.argmax(last[order])) + 1
+        emitted = order[:stop]
+        runs = np.repeat(np.arange(len(live)), sizes)[emitted]
+        for position, count in enumerate(np.bincount(runs, None, len(live))):
+            i = live[position]
+            blocks[i] = blocks[i].iloc[count:]
+        yield combined.iloc[emitted]
+
+
+def _partition(dataframe, keys, partitions, partial):
+    if partial:
+        hashes = pd.util.hash_pandas_object(dataframe.index, index=False)
+    else:
+        hashes = pd.util.hash_pandas_object(dataframe[keys], index=False)
+    numbers = hashes.to_numpy() % len(partitions)
+    for number in np.unique(numbers):
+        partitions[number].write(dataframe[numbers == number])
+
+
+def _aggregate(frames, by, keys, agg_func, partial):
+    if partial:
+        return stream.finish(stream.combine(frames, keys), agg_func)
+    grouped = pd.concat(frames).groupby(by, observed=True)
+    return grouped.agg(agg_func).reset_index()
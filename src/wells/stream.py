@@ -0,0 +1,125 @@
+import pandas as pd
+
+from wells import spill
+
+# steps that can run on each chunk on its own
+ROW_STEPS = {
+    "rename_columns",
+    "filter_columns",
+    "filter_rows",
+    "add_column",
+    "drop_columns",
+    "fill_missing",
+    "lookup_value",
+    "change_values",
+    "change_values_conditionally",
+    "join",
+}
+
+# how per-chunk partial aggregates combine into the final one
+COMBINE = {
+    "sum": "sum",
+    "count": "sum",
+    "min": "min",
+    "max": "max",
+    "first": "first",
+    "last": "last",
+}
+
+
+def split(steps):
+    """Split steps into the leading row-local run and the rest."""
+    for i, s in enumerate(steps):
+        if s.op not in ROW_STEPS:
+            return steps[:i], steps[i:]
+    return steps, []
+
+
+def execute(chunks, steps, run, memory_limit=None):
+    """Yield result chunks for steps applied over an iterable of frames.
+
+    run(dataframe, steps) applies steps to one frame. A group_by right
+    after the row-local steps is built from partial aggregates; any other
+    step after them needs the row-local results concatenated first. With
+    memory_limit (bytes) sort_rows and group_by instead run out of core,
+    spilling to temporary files past the limit (see spill).
+    """
+    row_steps, rest = split(steps)
+    results = (run(chunk, row_steps) for chunk in chunks)
+    if not rest:
+        yield from results
+    elif memory_limit is not None and rest[0].op == "sort_rows":
+        params = rest[0].params
+        ordered = spill.sort(
+            results, params["by"], params["ascending"], memory_limit
+        )
+        yield from execute(ordered, rest[1:], run, memory_limit)
+    elif memory_limit is not None and rest[0].op == "group_by":
+        params = rest[0].params
+        grouped = spill.group_by(
+            results, params["by"], params["agg_func"], memory_limit
+        )
+        yield from execute(grouped, rest[1:], run, memory_limit)
+    elif rest[0].op == "group_by" and decomposable(rest[0].params["agg_func"]):
+        params = rest[0].params
+        grouped = group_by(results, params["by"], params["agg_func"])
+        yield run(grouped, rest[1:])
+    else:
+        yield run(pd.concat(list(results)), rest)
+
+
+def decomposable(agg_func):
+    funcs = agg_func.values() if isinstance(agg_func, dict) else [agg_func]
+    # lists, callables and the like are left to the concat path
+    return all(
+        isinstance(f, str) and (f in COMBINE or f == "mean") for f in funcs
+    )
+
+
+def group_by(chunks, by, agg_func):
+    """groupby(by).agg(agg_func).reset_index() over chunks, holding only
+    one chunk and the running partial aggregates in memory."""
+    keys = by if isinstance(by, list) else [by]
+    partial = None
+    for chunk in chunks:
+        current = partial_agg(chunk, by, agg_func)
+        if partial is not None:
+            current = combine([partial, current], keys)
+        partial = current
+    if partial is None:
+        return pd.DataFrame(columns=keys)
+    return finish(partial, agg_func)
+
+
+def partial_agg(chunk, by, agg_func):
+    keys = by if isinstance(by, list) else [by]
+    if isinstance(agg_func, dict):
+        spec = agg_func
+    else:
+        spec = {c: agg_func for c in chunk.columns if c not in keys}
+    named = {}
+    for column, func in spec.items():
+        for part in ["sum", "count"] if func == "mean" else [func]:
+            named[f"{column}\0{part}"] = (column, part)
+    return chunk.groupby(by, observed=True).agg(**named)
+
+
+def combine(partials, keys):
+    partial = pd.concat(partials)
+    how = {c: COMBINE[c.split("\0")[1]] for c in partial.columns}
+    return partial.groupby(level=keys, observed=True).agg(how)
+
+
+def finish(partial, agg_func):
+    result = pd.DataFrame(index=partial.index)
+    for name in partial.columns:
+        column = name.split("\0")[0]
+        if column in result:
+            continue
+        func = agg_func[column] if isinstance(agg_func, dict) else agg_func
+        if func == "mean":
+            total = partial[f"{column}\0sum"]
+            result[column] = total / partial[f"{column}\0count"]
+        else:
+            result[column] = partial[f"{column}\0{func}"]
+    return result.reset_index()
@@ -0,0 +1,36 @@
+import gzip
+
+
+def write_json(
+    chunks, path, lines=False, indent=4, compression="infer", chunksize=100_000
+):
+    """Write frames as one JSON array of records, or NDJSON with lines=True.
+
+    Every frame is serialized chunksize rows at a time straight into the
+    file, so memory use depends on chunksize rather than on the row count.
+    compression is None, "gzip", or "infer" (gzip for a .gz path).
+    """
+    if compression == "infer":
+        compression = "gzip" if str(path).endswith(".gz") else None
+    if compression not in (None, "gzip"):
+        raise ValueError(f"unsupported compression {compression!r}")
+    opener = gzip.open if compression == "gzip" else open
+    with opener(path, "wt", encoding="utf-8") as out:
+        if lines:
+            for chunk in _slices(chunks, chunksize):
+                out.write(chunk.to_json(orient="records", lines=True))
+            return
+        out.write("[")
+        separator = "\n"
+        for chunk in _slices(chunks, chunksize):
+            text = chunk.to_json(orient="records", indent=indent)
+            out.write(separator)
+            out.write(text[1:-1].strip("\n"))
+            separator = ",\n"
+        out.write("\n]" if separator != "\n" else "]")
+
+
+def _slices(chunks, chunksize):
+    for chunk in chunks:
+        for start in range(0, len(chunk), chunksize):
+            yield chunk.iloc[start : start + chunksize]
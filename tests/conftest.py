@@ -0,0 +1,22 @@
+import sqlite3
+
+import pytest
+
+
+@pytest.fixture
+def helo_ref(tmp_path):
+    path = tmp_path / "helo_ref.db"
+    con = sqlite3.connect(path)
+    con.execute("CREATE TABLE helo_ref (type TEXT, code TEXT, value TEXT)")
+    con.executemany(
+        "INSERT INTO helo_ref VALUES (?, ?, ?)",
+        [
+            ("UNLOC", "USSFO", "San Francisco"),
+            ("UNLOC", "USHOU", "Houston"),
+            ("UNLOC", "GBLON", "London"),
+            ("PRODUCT", "OIL", "Crude oil"),
+        ],
+    )
+    con.commit()
+    con.close()
+    return str(path)
@@ -0,0 +1,102 @@
+import pandas as pd
+import pytest
+
+from wells import arrow
+from wells import schema
+from wells.dsl import DataMapper
+
+
+@pytest.fixture
+def pyarrow():
+    return pytest.importorskip("pyarrow")
+
+
+@pytest.fixture
+def csv_path(tmp_path):
+    frame = pd.DataFrame(
+        {
+            "well": [f"WELL-{i % 7:03d}" for i in range(500)],
+            "description": [f"monthly report row {i}" for i in range(500)],
+            "volume": [i * 0.5 for i in range(500)],
+        }
+    )
+    path = tmp_path / "production.csv"
+    frame.to_csv(path, index=False)
+    return path
+
+
+def test_require_without_pyarrow(monkeypatch):
+    monkeypatch.setattr(arrow, "pyarrow", None)
+    with pytest.raises(ImportError, match="wells\\[arrow\\]"):
+        DataMapper.from_csv("unused.csv", arrow=True)
+
+
+def test_from_csv_arrow_matches_pandas(pyarrow, csv_path):
+    mapper = DataMapper.from_csv(csv_path, arrow=True)
+    assert all(isinstance(t, pd.ArrowDtype) for t in mapper.df.dtypes)
+    expected = pd.read_csv(csv_path)
+    result = mapper.df.astype(expected.dtypes.to_dict())
+    pd.testing.assert_frame_equal(result, expected)
+    report = mapper.memory_report
+    assert schema.memory(mapper.df) * 2 < schema.memory(expected)
+    assert report["after"] <= report["before"]
+
+
+def test_filter_columns_shares_buffers(pyarrow, csv_path):
+    mapper = DataMapper.from_csv(csv_path, arrow=True)
+    before = mapper.df["description"].array._pa_array
+    after = mapper.filter_columns(["description"]).df["description"]
+    assert after.array._pa_array.chunks[0].buffers()[2].address == (
+        before.chunks[0].buffers()[2].address
+    )
+
+
+def test_chunked_arrow_read(pyarrow, csv_path):
+    steps = lambda m: m.filter_rows("volume > 10").group_by(  # noqa: E731
+        "well", {"volume": "sum"}
+    )
+    chunked = steps(DataMapper.from_csv(csv_path, arrow=True, chunksize=64))
+    eager = steps(DataMapper.from_csv(csv_path))
+    result = chunked.df.astype(eager.df.dtypes.to_dict())
+    pd.testing.assert_frame_equal(result, eager.df)
+
+
+def test_chunks_keep_row_numbers(pyarrow, csv_path):
+    with arrow.read_csv(csv_path, chunksize=200) as reader:
+        chunks = list(reader)
+    assert [len(c) for c in chunks] == [200, 200, 100]
+    assert [c.index[0] for c in chunks] == [0, 200, 400]
+
+
+def test_schema_with_arrow(pyarrow, csv_path):
+    mapper = DataMapper.from_csv(
+        csv_path, arrow=True, schema={"well": "category", "volume": "float32"}
+    )
+    assert list(mapper.df.columns) == ["well", "volume"]
+    assert mapper.df["volume"].dtype == pd.ArrowDtype(pyarrow.float32())
+    assert pyarrow.types.is_dictionary(mapper.df["well"].dtype.pyarrow_dtype)
+
+
+def test_from_pandas_keeps_mixed_objects(pyarrow):
+    frame = pd.DataFrame({"a": [1.0, None], "b": ["x", {"k": 1}]})
+    result = arrow.from_pandas(frame)
+    assert isinstance(result["a"].dtype, pd.ArrowDtype)
+    assert result["b"].dtype == object
+
+
+def test_to_parquet_and_ipc(pyarrow, csv_path, tmp_path):
+    import pyarrow.ipc
+    import pyarrow.parquet
+
+    mapper = DataMapper.from_csv(csv_path, arrow=True, chunksize=200)
+    mapper.to_parquet(tmp_path / "out.parquet")
+    mapper.to_ipc(tmp_path / "out.arrow", compression="zstd")
+    expected = pd.read_csv(csv_path)
+    dtypes = expected.dtypes.to_dict()
+    metadata = pyarrow.parquet.read_metadata(tmp_path / "out.parquet")
+    assert metadata.num_row_groups == 3
+    parquet = pd.read_parquet(tmp_path / "out.parquet")
+    pd.testing.assert_frame_equal(parquet.astype(dtypes), expected)
+    with pyarrow.ipc.open_file(tmp_path / "out.arrow") as reader:
+        ipc = reader.read_all().to_pandas()
+    pd.testing.assert_frame_equal(ipc.astype(dtypes), expected)
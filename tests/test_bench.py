@@ -0,0 +1,32 @@
+from wells import bench
+
+
+def test_run_and_compare():
+    current = bench.run(
+        [240], repeat=1, only=["filter_rows", "group_by", "chain_lazy"]
+    )
+    assert [r["case"] for r in current["results"]] == [
+        "filter_rows",
+        "group_by",
+        "chain_lazy",
+    ]
+    assert all(r["seconds"] > 0 for r in current["results"])
+    assert bench.compare(current, current) == []
+
+    slower = {
+        "results": [
+            dict(r, seconds=r["seconds"] * 2) for r in current["results"]
+        ]
+    }
+    regressions = bench.compare(slower, current, tolerance=0.5)
+    assert {r["case"] for r in regressions} == {
+        "filter_rows",
+        "group_by",
+        "chain_lazy",
+    }
+    assert {r["metric"] for r in regressions} == {"seconds"}
+
+
+def test_production_data_pivots():
+    df = bench.production_data(36)
+    assert not df.duplicated(["property_id", "month"]).any()
@@ -49,6 +49,22 @@ def test_add_column(sample_data):
     assert mapper.df["new_column"].tolist() == [6, 8, 10, 12]
 
 
+def test_add_column_expression(sample_data):
+    mapper = DataMapper(sample_data)
+    mapper.add_column("new_column", "old_column1 * old_column2")
+    assert mapper.df["new_column"].tolist() == [5, 12, 21, 32]
+
+
+def test_add_column_vectorized(sample_data):
+    mapper = DataMapper(sample_data)
+    mapper.add_column(
+        "new_column",
+        lambda df: df["old_column1"] + df["old_column2"],
+        vectorized=True,
+    )
+    assert mapper.df["new_column"].tolist() == [6, 8, 10, 12]
+
+
 def test_lookup_value(sample_data):
     mapper = DataMapper(sample_data)
     lookup_dict = {"a": "alpha", "b": "beta", "c": "gamma", "d": "delta"}
@@ -94,6 +110,14 @@ def test_change_values(sample_data):
     assert mapper.df["old_column1"].tolist() == [2, 4, 6, 8]
 
 
+def test_change_values_vectorized(sample_data):
+    mapper = DataMapper(sample_data)
+    mapper.change_values("old_column1", lambda col: col * 2, vectorized=True)
+    mapper.change_values("old_column2", "old_column2 - old_column1")
+    assert mapper.df["old_column1"].tolist() == [2, 4, 6, 8]
+    assert mapper.df["old_column2"].tolist() == [3, 2, 1, 0]
+
+
 def test_change_values_conditionally(sample_data):
     mapper = DataMapper(sample_data)
     mapper.change_values_conditionally(
@@ -102,6 +126,18 @@ def test_change_values_conditionally(sample_data):
     assert mapper.df["old_column1"].tolist() == [1, 2, 6, 8]
 
 
+def test_change_values_conditionally_vectorized(sample_data):
+    mapper = DataMapper(sample_data)
+    mapper.change_values_conditionally(
+        "old_column1", "old_column1 > 2", "old_column1 + old_column2"
+    )
+    mapper.change_values_conditionally(
+        "old_column2", "old_columnA == 'a'", lambda s: -s, vectorized=True
+    )
+    assert mapper.df["old_column1"].tolist() == [1, 2, 10, 12]
+    assert mapper.df["old_column2"].tolist() == [-5, 6, 7, 8]
+
+
 def test_pivot(sample_data):
     data = {
         "index": [1, 1, 2, 2],
@@ -138,3 +174,533 @@ def test_example(sample_data):
     ).add_column(
         "new_column3", lambda row: row["new_column1"] + row["new_column2"]
     ).to_json("example.json")
+
+
+def test_lazy_matches_eager(sample_data):
+    def chain(mapper):
+        return (
+            mapper.rename_columns({"old_column1": "new_column1"})
+            .rename_columns({"new_column1": "a"})
+            .add_column("b", lambda row: row["a"] * 10)
+            .filter_rows("a > 1")
+            .drop_columns(["old_columnA"])
+            .drop_columns("old_columnB")
+            .sort_rows(by="a", ascending=False)
+        )
+
+    eager = chain(DataMapper(sample_data)).df
+    lazy = chain(DataMapper.from_csv(sample_data, lazy=True))
+    assert lazy.plan
+    pd.testing.assert_frame_equal(lazy.collect(), eager)
+    assert lazy.plan == []
+
+
+@pytest.mark.parametrize(
+    "chain",
+    [
+        lambda m: m.filter_rows("old_column1 > 1")
+        .drop_columns(["old_column1"])
+        .rename_columns({"old_column2": "old_column1"})
+        .filter_columns(["old_column1"]),
+        lambda m: m.rename_columns({"old_column1": "tmp"})
+        .rename_columns({"old_column2": "old_column1"})
+        .rename_columns({"tmp": "old_column2"})
+        .filter_columns(["old_column1", "old_column2"]),
+        lambda m: m.rename_columns(str.upper).filter_columns(["OLD_COLUMNA"]),
+    ],
+    ids=["drop_then_reuse_name", "swap", "callable_rename"],
+)
+@pytest.mark.parametrize(
+    "options", [{"lazy": True}, {"chunksize": 2}, {"workers": 2}]
+)
+def test_optimized_renames_match_eager(sample_data, chain, options):
+    eager = chain(DataMapper(sample_data)).df
+    result = chain(DataMapper.from_csv(sample_data, **options)).collect()
+    pd.testing.assert_frame_equal(
+        result.reset_index(drop=True), eager.reset_index(drop=True)
+    )
+
+
+def test_lazy_explain_optimizes_plan(sample_data):
+    mapper = (
+        DataMapper.from_csv(sample_data, lazy=True)
+        .rename_columns({"old_column1": "x"})
+        .rename_columns({"old_column2": "y"})
+        .add_column("z", lambda row: row["x"] + row["y"])
+        .add_column("unused", lambda row: row["x"])
+        .filter_rows("x > 2")
+        .filter_columns(["x", "z"])
+    )
+    lines = mapper.explain().splitlines()
+    assert [line.split("(")[0].strip() for line in lines[1:]] == [
+        "rename_columns",
+        "filter_rows",
+        "add_column",
+        "filter_columns",
+    ]
+    assert "'old_column1': 'x', 'old_column2': 'y'" in lines[1]
+    assert mapper.df["z"].tolist() == [10, 12]
+
+
+def test_lazy_prunes_scan_columns(sample_data):
+    mapper = (
+        DataMapper.from_csv(sample_data, lazy=True)
+        .filter_rows("old_column1 > 2")
+        .filter_columns(["old_columnA"])
+    )
+    assert "columns=['old_column1', 'old_columnA']" in mapper.explain()
+    assert mapper.df["old_columnA"].tolist() == ["c", "d"]
+
+
+def test_lazy_expression_prunes_scan_columns(sample_data):
+    mapper = (
+        DataMapper.from_csv(sample_data, lazy=True)
+        .add_column("total", "old_column1 + old_columnB")
+        .filter_columns(["total"])
+    )
+    assert "columns=['old_column1', 'old_columnB']" in mapper.explain()
+    assert mapper.df["total"].tolist() == [11, 22, 33, 44]
+
+
+def test_streaming_matches_eager(sample_data, tmp_path):
+    def chain(mapper):
+        return mapper.rename_columns({"old_column1": "a"}).add_column(
+            "b", "a * old_columnB"
+        )
+
+    eager = chain(DataMapper(sample_data))
+    streaming = chain(DataMapper.from_csv(sample_data, chunksize=3))
+    pd.testing.assert_frame_equal(streaming.collect(), eager.df)
+
+    eager.to_json(tmp_path / "eager.json")
+    streaming.to_json(tmp_path / "streaming.json")
+    assert (tmp_path / "streaming.json").read_text() == (
+        tmp_path / "eager.json"
+    ).read_text()
+
+    connection_string = f"sqlite:///{tmp_path / 'out.db'}"
+    streaming.to_sql("wells", connection_string)
+    loaded = pd.read_sql_table("wells", connection_string)
+    assert loaded["b"].tolist() == [10, 40, 90, 160]
+
+
+def test_streaming_group_by_merges_partials(tmp_path):
+    path = tmp_path / "groups.csv"
+    pd.DataFrame(
+        {
+            "key": ["a", "b", "a", "c", "b", "a", "c"],
+            "x": [1, 2, 3, 4, 5, 6, 7],
+            "y": [1.0, None, 3.0, 4.0, 5.0, 6.0, 7.0],
+        }
+    ).to_csv(path, index=False)
+    agg = {"x": "sum", "y": "mean"}
+    eager = DataMapper.from_csv(path).group_by("key", agg).df
+    streaming = DataMapper.from_csv(path, chunksize=2).group_by("key", agg)
+    pd.testing.assert_frame_equal(streaming.collect(), eager)
+
+
+@pytest.mark.parametrize("agg", [["sum", "max"], {"x": ["sum", "max"]}])
+def test_streaming_group_by_list_agg(tmp_path, agg):
+    path = tmp_path / "groups.csv"
+    pd.DataFrame(
+        {"key": ["a", "b", "a", "c", "b"], "x": [1, 2, 3, 4, 5]}
+    ).to_csv(path, index=False)
+    eager = DataMapper.from_csv(path).group_by("key", agg).df
+    streaming = DataMapper.from_csv(path, chunksize=2).group_by("key", agg)
+    pd.testing.assert_frame_equal(streaming.collect(), eager)
+
+
+def test_parallel_matches_serial():
+    df = pd.DataFrame(
+        {
+            "key": [i % 7 for i in range(1000)],
+            "x": [(i * 37) % 101 for i in range(1000)],
+        }
+    )
+
+    def chain(mapper):
+        return mapper.add_column("y", lambda row: row["x"] * 2).filter_rows(
+            "x > 10"
+        )
+
+    serial = chain(DataMapper(df.copy()))
+    parallel = chain(DataMapper(df.copy(), workers=4))
+    pd.testing.assert_frame_equal(parallel.collect(), serial.df)
+
+    sort = lambda m: chain(m).sort_rows(by="x", ascending=False)
+    pd.testing.assert_frame_equal(
+        sort(DataMapper(df.copy(), workers=4)).df, sort(DataMapper(df.copy())).df
+    )
+
+    agg = {"x": "mean", "y": "max"}
+    group = lambda m: chain(m).group_by("key", agg)
+    pd.testing.assert_frame_equal(
+        group(DataMapper(df.copy(), workers=3)).df,
+        group(DataMapper(df.copy())).df,
+    )
+
+
+@pytest.mark.filterwarnings("ignore:This process .* is multi-threaded")
+def test_parallel_collects_concurrently():
+    from concurrent.futures import ThreadPoolExecutor
+
+    def run(offset):
+        df = pd.DataFrame({"x": range(offset, offset + 200)})
+        mapper = DataMapper(df, lazy=True, workers=2)
+        return mapper.add_column("y", lambda row: row["x"] + 1).collect()
+
+    offsets = [0, 1000, 2000, 3000]
+    with ThreadPoolExecutor(4) as pool:
+        results = list(pool.map(run, offsets))
+    for offset, result in zip(offsets, results):
+        assert result["x"].tolist() == list(range(offset, offset + 200))
+        assert (result["y"] == result["x"] + 1).all()
+
+
+def test_parallel_over_files(sample_data, tmp_path):
+    paths = [sample_data, tmp_path / "more.csv"]
+    pd.read_csv(sample_data).to_csv(paths[1], index=False)
+    serial = DataMapper.from_csv(paths).filter_rows("old_column1 > 2")
+    parallel = DataMapper.from_csv(paths, workers=2).filter_rows(
+        "old_column1 > 2"
+    )
+    pd.testing.assert_frame_equal(parallel.df, serial.df)
+    assert parallel.df["old_column1"].tolist() == [3, 4, 3, 4]
+
+
+def test_from_many(sample_data, tmp_path):
+    from wells.dsl import UnreadableFileWarning
+
+    df = pd.read_csv(sample_data)
+    df.to_csv(tmp_path / "a.csv", index=False)
+    df.iloc[:2].to_excel(tmp_path / "b.xlsx", index=False)
+    (tmp_path / "c.csv").write_bytes(b"\xff\xfe\x00garbage")
+    with pytest.warns(UnreadableFileWarning):
+        mapper = DataMapper.from_many(
+            str(tmp_path / "*.*"),
+            errors="warn",
+            source_column="source",
+            cache=False,
+        )
+    assert len(mapper.df) == 6
+    assert mapper.df.index.tolist() == list(range(6))
+    assert mapper.df["source"].value_counts().to_dict() == {
+        str(tmp_path / "a.csv"): 4,
+        str(tmp_path / "b.xlsx"): 2,
+    }
+    assert [path for path, _ in mapper.failures] == [str(tmp_path / "c.csv")]
+
+    paths = [tmp_path / "a.csv", tmp_path / "b.xlsx"]
+    lazy = (
+        DataMapper.from_many(
+            paths,
+            executor="thread",
+            source_column="source",
+            lazy=True,
+            cache=False,
+        )
+        .filter_columns(["old_column1", "source"])
+        .filter_rows("old_column1 > 1")
+    )
+    result = lazy.collect()
+    assert result.columns.tolist() == ["old_column1", "source"]
+    assert result["old_column1"].tolist() == [2, 3, 4, 2]
+
+    with pytest.raises(Exception):
+        DataMapper.from_many([tmp_path / "a.csv", tmp_path / "c.csv"])
+
+
+def test_to_json_lines_gzip(sample_data, tmp_path):
+    import gzip
+
+    mapper = DataMapper(sample_data)
+    path = tmp_path / "output.ndjson.gz"
+    mapper.to_json(path, lines=True, chunksize=3)
+    with gzip.open(path, "rt") as json_file:
+        records = [json.loads(line) for line in json_file]
+    assert [r["old_columnA"] for r in records] == ["a", "b", "c", "d"]
+
+
+def test_to_json_chunked_array(sample_data, tmp_path):
+    mapper = DataMapper(sample_data)
+    path = tmp_path / "output.json"
+    mapper.to_json(path, chunksize=3)
+    with open(path) as json_file:
+        data = json.load(json_file)
+    assert data == json.loads(pd.read_csv(sample_data).to_json(orient="records"))
+
+    mapper.filter_rows("old_column1 > 10").to_json(path)
+    with open(path) as json_file:
+        assert json.load(json_file) == []
+
+
+def test_to_sql_modes(sample_data, tmp_path):
+    connection_string = f"sqlite:///{tmp_path / 'out.db'}"
+    stats = DataMapper(sample_data).to_sql(
+        "wells", connection_string, indexes=["old_columnA"]
+    )
+    assert stats["rows"] == 4
+    assert stats["rows_per_second"] > 0
+
+    DataMapper(sample_data).filter_rows("old_column1 > 2").to_sql(
+        "wells", connection_string, if_exists="append"
+    )
+    loaded = pd.read_sql_table("wells", connection_string)
+    assert loaded["old_column1"].tolist() == [1, 2, 3, 4, 3, 4]
+
+    DataMapper(sample_data).to_sql(
+        "upserted", connection_string, if_exists="upsert", key="old_columnA"
+    )
+    DataMapper(sample_data).change_values("old_columnB", "old_columnB + 1").to_sql(
+        "upserted", connection_string, if_exists="upsert", key="old_columnA"
+    )
+    loaded = pd.read_sql_table("upserted", connection_string)
+    assert loaded["old_columnB"].tolist() == [11, 21, 31, 41]
+
+
+def test_to_sql_stores_datetimes_like_sqlalchemy(tmp_path):
+    import sqlite3
+    import warnings
+
+    path = tmp_path / "out.db"
+    times = pd.DataFrame({"t": pd.to_datetime(["2024-01-01 10:00"])})
+    times.to_sql("times", f"sqlite:///{path}", index=False)
+    with warnings.catch_warnings():
+        warnings.simplefilter("error", DeprecationWarning)
+        DataMapper(times.copy()).to_sql("times", str(path), if_exists="append")
+    stored = sqlite3.connect(path).execute("SELECT t FROM times").fetchall()
+    assert stored == [("2024-01-01 10:00:00.000000",)] * 2
+
+
+def test_to_sql_defers_indexes(sample_data, tmp_path):
+    from wells import loader
+
+    path = tmp_path / "out.db"
+    DataMapper(sample_data).to_sql("wells", str(path), indexes=["old_column1"])
+    DataMapper(sample_data).to_sql("wells", str(path), if_exists="append")
+    with loader.engine(str(path)).connect() as conn:
+        names = conn.exec_driver_sql(
+            "SELECT name FROM sqlite_master WHERE type = 'index'"
+        ).scalars()
+        assert list(names) == ["ix_wells_old_column1"]
+        assert conn.exec_driver_sql("PRAGMA synchronous").scalar() == 2
+
+
+def test_from_xlsx_cache(tmp_path, monkeypatch):
+    from wells.cache import XlsxCache
+
+    path = tmp_path / "sample.xlsx"
+    pd.DataFrame({"a": [1, 2, 3], "b": ["x", None, "z"]}).to_excel(
+        path, index=False
+    )
+    cache = XlsxCache(tmp_path / "cache")
+    parsed = DataMapper.from_xlsx(path, cache=cache).df
+
+    def no_parse(*args, **kwargs):
+        raise AssertionError("workbook parsed again")
+
+    monkeypatch.setattr(pd, "read_excel", no_parse)
+    cached = DataMapper.from_xlsx(path, cache=cache)
+    pd.testing.assert_frame_equal(cached.df, parsed)
+    cached.change_values("a", "a * 10")
+    pd.testing.assert_frame_equal(
+        DataMapper.from_xlsx(path, cache=cache).df, parsed
+    )
+
+    cache.invalidate(path)
+    with pytest.raises(AssertionError, match="parsed again"):
+        DataMapper.from_xlsx(path, cache=cache)
+
+
+def test_xlsx_cache_keys_on_read_arguments(tmp_path):
+    import warnings
+
+    from wells.cache import XlsxCache
+
+    path = tmp_path / "sample.xlsx"
+    pd.DataFrame(
+        {"a": [1, 2], "b": ["x", "y"], "d": ["2024-01-01", "2024-01-02"]}
+    ).to_excel(path, index=False)
+    cache = XlsxCache(tmp_path / "cache")
+    assert cache.read_excel(path)["a"].dtype == "int64"
+    as_text = cache.read_excel(path, dtype={"a": str})
+    assert as_text["a"].tolist() == ["1", "2"]
+    converted = cache.read_excel(path, converters={"a": lambda v: v * 10})
+    assert converted["a"].tolist() == [10, 20]
+    header = cache.read_excel(path, header=None).iloc[0]
+    assert header.tolist() == ["a", "b", "d"]
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        dates = cache.read_excel(path, usecols=["a", "d"], parse_dates=["d"])
+    assert dates["d"].dtype == "datetime64[ns]"
+
+
+def test_disk_cache_evicts_least_recently_used(tmp_path):
+    from wells.cache import DiskCache
+
+    store = DiskCache(tmp_path, max_bytes=10**9)
+    frame = pd.DataFrame({"x": range(1000)})
+    store.put("old", frame)
+    store.put("new", frame)
+    os.utime(tmp_path / "old" / "meta.json", (0, 0))
+    store.max_bytes = 12000
+    store.evict()
+    assert store.get("old") is None
+    pd.testing.assert_frame_equal(store.get("new"), frame)
+
+
+@pytest.fixture
+def production_data(tmp_path):
+    path = tmp_path / "production.csv"
+    pd.DataFrame(
+        {
+            "location": ["Permian", "Bakken", "Permian", None] * 50,
+            "metric": ["Daily Rate", "Volume", "Daily Rate", "Volume"] * 50,
+            "wells": [3, 5, 7, 9] * 50,
+            "value": [1.5, 2.25, 3.0, 4.5] * 50,
+            "month": ["2024-01-01", "2024-02-01", "2024-03-01", "2024-04-01"]
+            * 50,
+        }
+    ).to_csv(path, index=False)
+    return path
+
+
+def test_from_csv_optimize(production_data):
+    mapper = DataMapper.from_csv(production_data, optimize=True)
+    dtypes = mapper.df.dtypes
+    assert dtypes["location"] == "category"
+    assert dtypes["wells"] == "int32"
+    assert dtypes["value"] == "float32"
+    assert mapper.memory_report["after"] < mapper.memory_report["before"]
+
+    expected = DataMapper.from_csv(production_data)
+    for m in (mapper, expected):
+        m.fill_missing("location", "Unknown").change_values_conditionally(
+            "metric", "wells > 6", lambda x: "Other"
+        ).group_by("location", {"wells": "sum"})
+    assert mapper.df["location"].tolist() == expected.df["location"].tolist()
+    assert mapper.df["wells"].tolist() == expected.df["wells"].tolist()
+
+
+def test_from_csv_schema(production_data):
+    mapper = DataMapper.from_csv(
+        production_data,
+        schema={"metric": "category", "month": "datetime", "value": "float64"},
+    )
+    assert list(mapper.df.columns) == ["metric", "value", "month"]
+    assert mapper.df["month"].dtype == "datetime64[ns]"
+    assert mapper.df["metric"].dtype == "category"
+
+
+def test_lookup_value_with_lookup(helo_ref):
+    from wells.dsl import MissingCodesWarning
+    from wells.ref_data import SqliteLookup
+
+    mapper = DataMapper(
+        pd.DataFrame({"port": ["USSFO", "USHOU", "USSFO", "NOPE", None]})
+    )
+    with pytest.warns(MissingCodesWarning) as record:
+        mapper.lookup_value("port", SqliteLookup(helo_ref), "UNLOC")
+    assert record[0].message.codes == ["NOPE"]
+    assert mapper.df["port"].tolist()[:3] == [
+        "San Francisco",
+        "Houston",
+        "San Francisco",
+    ]
+    assert mapper.df["port"].isna().tolist()[3:] == [True, True]
+
+
+def test_memo_resumes_from_deepest_cached_step(sample_data, tmp_path):
+    from wells.memo import PipelineCache
+
+    def chain(memo):
+        return (
+            DataMapper.from_csv(sample_data, memo=memo)
+            .filter_rows("old_column1 > 1")
+            .add_column("total", lambda row: row["old_column1"] * 2)
+        )
+
+    memo = PipelineCache(tmp_path)
+    first = chain(memo).collect()
+    assert memo.stats["stores"] == 2
+
+    pd.testing.assert_frame_equal(chain(memo).collect(), first)
+    assert memo.stats["memory_hits"] == 1
+    assert memo.stats["stores"] == 2
+
+    longer = chain(memo).sort_rows(by="total", ascending=False).collect()
+    assert longer["total"].tolist() == [8, 6, 4]
+    assert memo.stats["memory_hits"] == 2
+    assert memo.stats["stores"] == 3
+
+    fresh = PipelineCache(tmp_path)
+    pd.testing.assert_frame_equal(chain(fresh).collect(), first)
+    assert fresh.stats["disk_hits"] == 1
+
+
+def test_memo_fingerprints_arguments():
+    from wells.memo import token
+
+    assert token("a > 1") == token("a > 1")
+    assert token({"a": 1, "b": 2}) == token({"b": 2, "a": 1})
+    assert token(lambda row: row["a"] + 1) == token(lambda row: row["a"] + 1)
+    assert token(lambda row: row["a"] + 1) != token(lambda row: row["a"] + 2)
+    factor = 3
+    assert token(lambda x: x * factor) != token(lambda x: x * 4)
+    assert token({"a": 1}.get) != token({"a": 2}.get)
+
+
+def test_memo_sees_bound_method_state(tmp_path):
+    from wells.memo import PipelineCache
+
+    memo = PipelineCache(tmp_path)
+    names = {1: "one", 2: "two"}
+
+    def run():
+        frame = pd.DataFrame({"code": [1, 2]})
+        mapper = DataMapper(frame, lazy=True, memo=memo)
+        return mapper.change_values("code", names.get).collect()
+
+    assert run()["code"].tolist() == ["one", "two"]
+    names[2] = "deux"
+    assert run()["code"].tolist() == ["one", "deux"]
+    assert memo.stats["memory_hits"] == 0
+
+
+def test_trace_records_steps(sample_data, tmp_path):
+    from wells.trace import Trace
+
+    trace = Trace()
+    (
+        DataMapper.from_csv(sample_data, trace=trace)
+        .filter_rows("old_column1 > 1")
+        .drop_columns(["old_columnA"])
+        .add_column("total", "old_column1 * 2")
+    )
+    steps = [r["step"] for r in trace.records]
+    assert steps == ["scan", "filter_rows", "drop_columns", "add_column"]
+    filter_rows = trace.records[1]
+    assert filter_rows["args"] == {"condition": "'old_column1 > 1'"}
+    assert (filter_rows["rows_in"], filter_rows["rows_out"]) == (4, 3)
+    drop_columns, add_column = trace.records[2:]
+    assert (drop_columns["columns_in"], drop_columns["columns_out"]) == (4, 3)
+    assert (add_column["columns_in"], add_column["columns_out"]) == (3, 4)
+    assert (add_column["rows_in"], add_column["rows_out"]) == (3, 3)
+    assert all(r["wall"] >= 0 and "memory_peak" in r for r in trace.records)
+    assert "filter_rows" in trace.summary()
+
+    lazy = Trace(memory=False)
+    DataMapper(sample_data, lazy=True, trace=lazy).filter_rows(
+        "old_column1 > 1"
+    ).collect()
+    assert [r["step"] for r in lazy.records] == ["scan", "filter_rows"]
+
+    trace.to_chrome(tmp_path / "trace.json")
+    events = json.loads((tmp_path / "trace.json").read_text())["traceEvents"]
+    assert [e["name"] for e in events] == steps
+    assert events[1]["args"]["rows_out"] == 3
+
+
+def test_no_trace_by_default(sample_data):
+    mapper = DataMapper(sample_data).filter_rows("old_column1 > 1")
+    assert mapper.trace is None
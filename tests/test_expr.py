@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from wells import expr
+
+
+@pytest.fixture
+def frame():
+    return pd.DataFrame(
+        {
+            "a": [1, 2, 3, 4],
+            "b": [5.0, 6.0, np.nan, 8.0],
+            "s": ["a", "b", "c", "d"],
+            "x y": [1, 0, 1, 0],
+        }
+    )
+
+
+@pytest.mark.parametrize(
+    "condition",
+    [
+        "a > 1 & b < 8",
+        "a > 1 and not b > 6",
+        "1 < a <= 3",
+        "s in ['a', 'c']",
+        "s not in ['a', 'c']",
+        "s == ['a', 'c']",
+        "`x y` == 1 | a == 4",
+        "sqrt(a) > 1.5",
+        "~(a > 2)",
+    ],
+)
+def test_mask_matches_query(frame, condition):
+    rows = expr.mask(frame, condition)
+    pd.testing.assert_frame_equal(frame.loc[rows], frame.query(condition))
+
+
+def test_compile_is_cached_and_knows_its_columns():
+    expression = expr.compile("`x y` > 1 and sqrt(b) < c")
+    assert expr.compile("`x y` > 1 and sqrt(b) < c") is expression
+    assert expression.columns == {"x y", "b", "c"}
+
+
+def test_evaluate_falls_back_to_eval(frame):
+    assert expr.evaluate(frame, "a * 2").tolist() == [2, 4, 6, 8]
+    assert expr.evaluate(frame, "index > 1").tolist() == [
+        False,
+        False,
+        True,
+        True,
+    ]
+
+
+def test_numexpr_matches_pandas(monkeypatch):
+    pytest.importorskip("numexpr")
+    monkeypatch.setattr(expr, "NUMEXPR_MIN_ROWS", 0)
+    frame = pd.DataFrame({"a": np.arange(100.0), "b": np.arange(100) % 7})
+    pd.testing.assert_series_equal(
+        expr.mask(frame, "a > 10 & b == 3"),
+        (frame["a"] > 10) & (frame["b"] == 3),
+    )
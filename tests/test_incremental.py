@@ -0,0 +1,134 @@
+import sqlite3
+
+import pandas as pd
+import pytest
+
+from wells.dsl import DataMapper
+from wells.incremental import Checkpoints
+from wells.incremental import SourceChanged
+
+
+@pytest.fixture
+def checkpoints(tmp_path):
+    return Checkpoints(tmp_path / "checkpoints.json")
+
+
+def test_csv_runs_only_new_rows(tmp_path, checkpoints):
+    source, target = tmp_path / "production.csv", tmp_path / "target.db"
+    pd.DataFrame({"id": [1, 2], "volume": [10.0, 20.0]}).to_csv(
+        source, index=False
+    )
+
+    def run():
+        mapper = DataMapper.from_csv(
+            source, incremental=checkpoints, wait_for_newline=True
+        )
+        return mapper.add_column("double", "volume * 2").to_sql(
+            "production", target
+        )
+
+    assert run()["rows"] == 2
+    with open(source, "a") as f:
+        f.write("3,30.0\n4,40")
+    assert run()["rows"] == 1
+    assert run()["rows"] == 0
+    with open(source, "a") as f:
+        f.write(".0\n")
+    assert run()["rows"] == 1
+
+    loaded = pd.read_sql("SELECT * FROM production", sqlite3.connect(target))
+    assert loaded["id"].tolist() == [1, 2, 3, 4]
+    assert loaded["double"].tolist() == [20.0, 40.0, 60.0, 80.0]
+
+
+def test_csv_last_line_without_newline(tmp_path, checkpoints):
+    source = tmp_path / "production.csv"
+    source.write_text("a,b\n1,2\n3,4")
+    assert len(DataMapper.from_csv(source).df) == 2
+
+    def run():
+        mapper = DataMapper.from_csv(source, incremental=checkpoints)
+        rows = mapper.df["a"].tolist()
+        mapper.commit()
+        return rows
+
+    assert run() == [1, 3]
+    assert run() == []
+    with open(source, "a") as f:
+        f.write("\n5,6\n")
+    assert run() == [5]
+
+
+def test_csv_watermark_waits_for_commit(tmp_path, checkpoints):
+    source = tmp_path / "production.csv"
+    pd.DataFrame({"id": [1, 2]}).to_csv(source, index=False)
+    assert len(DataMapper.from_csv(source, incremental=checkpoints).df) == 2
+    mapper = DataMapper.from_csv(source, incremental=checkpoints, chunksize=1)
+    assert len(mapper.collect()) == 2
+    mapper.commit()
+    assert len(DataMapper.from_csv(source, incremental=checkpoints).df) == 0
+
+
+def test_csv_schema_subset_on_later_runs(tmp_path, checkpoints):
+    source = tmp_path / "production.csv"
+    source.write_text("id,name,v\n1,a,1.5\n")
+    schema = {"id": "int64", "v": "float64"}
+
+    def run(**kwargs):
+        return DataMapper.from_csv(
+            source, incremental=checkpoints, schema=schema, **kwargs
+        )
+
+    run().commit()
+    with open(source, "a") as f:
+        f.write("2,z,2.5\n3,y,3.5\n")
+    assert run(chunksize=1).collect().to_dict("list") == {
+        "id": [2, 3],
+        "v": [2.5, 3.5],
+    }
+    assert run().df.to_dict("list") == {"id": [2, 3], "v": [2.5, 3.5]}
+
+
+def test_csv_rewritten_source(tmp_path, checkpoints):
+    source = tmp_path / "production.csv"
+    pd.DataFrame({"id": [1, 2]}).to_csv(source, index=False)
+    DataMapper.from_csv(source, incremental=checkpoints).commit()
+    pd.DataFrame({"id": [5, 6, 7]}).to_csv(source, index=False)
+    with pytest.raises(SourceChanged):
+        DataMapper.from_csv(source, incremental=checkpoints)
+    checkpoints.reset()
+    assert len(DataMapper.from_csv(source, incremental=checkpoints).df) == 3
+
+
+def test_xlsx_skips_rows_already_read(tmp_path, checkpoints):
+    source = tmp_path / "production.xlsx"
+    pd.DataFrame({"id": [1, 2]}).to_excel(source, index=False)
+    options = {"cache": False, "incremental": checkpoints}
+    DataMapper.from_xlsx(source, **options).commit()
+    pd.DataFrame({"id": [1, 2, 3]}).to_excel(source, index=False)
+    assert DataMapper.from_xlsx(source, **options).df["id"].tolist() == [3]
+
+
+def test_table_reads_above_max_key(tmp_path, checkpoints):
+    db = tmp_path / "source.db"
+    con = sqlite3.connect(db)
+    con.execute("CREATE TABLE production (id INTEGER, volume REAL)")
+    con.executemany(
+        "INSERT INTO production VALUES (?, ?)", [(1, 1.0), (2, 2.0)]
+    )
+    con.commit()
+
+    def run():
+        mapper = DataMapper.from_table(
+            "production", db, key="id", incremental=checkpoints, lazy=True
+        )
+        result = mapper.filter_columns(["volume"]).collect()
+        mapper.commit()
+        return result["volume"].tolist()
+
+    assert run() == [1.0, 2.0]
+    con.execute("INSERT INTO production VALUES (3, 3.0)")
+    con.commit()
+    assert run() == [3.0]
+    assert run() == []
+    assert len(DataMapper.from_table("production", db).df) == 3
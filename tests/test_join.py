@@ -0,0 +1,102 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from wells import join
+from wells.dsl import DataMapper
+
+
+@pytest.fixture
+def facts():
+    rng = np.random.default_rng(0)
+    return pd.DataFrame(
+        {
+            "property_id": rng.integers(0, 60, 500),
+            "volume": rng.random(500),
+            "name": "fact",
+        }
+    )
+
+
+@pytest.fixture
+def properties():
+    return pd.DataFrame(
+        {
+            "property_id": np.arange(50),
+            "name": [f"well {i}" for i in range(50)],
+            "basin": ["Permian", "Bakken"] * 25,
+        }
+    )
+
+
+@pytest.mark.parametrize("how", ["left", "inner"])
+@pytest.mark.parametrize("duplicates", [False, True])
+def test_join_matches_merge(facts, properties, how, duplicates):
+    if duplicates:
+        properties = pd.concat([properties, properties.iloc[:5]])
+    result = DataMapper(facts.copy()).join(
+        properties, on="property_id", how=how
+    )
+    expected = facts.merge(
+        properties, on="property_id", how=how, suffixes=("", "_right")
+    )
+    pd.testing.assert_frame_equal(result.df.reset_index(drop=True), expected)
+
+
+def test_join_reuses_index(facts, properties):
+    index = join.HashIndex(properties, "property_id")
+    first = DataMapper(facts.copy()).join(index, on="property_id").df
+    second = DataMapper(facts.copy()).join(properties, on="property_id").df
+    pd.testing.assert_frame_equal(first, second)
+
+
+def test_join_sees_frame_edited_in_place(facts, properties):
+    DataMapper(facts.copy()).join(properties, on="property_id")
+    properties.loc[0, "property_id"] = 55
+    properties.loc[1, "name"] = "renamed"
+    result = DataMapper(facts.copy()).join(properties, on="property_id").df
+    expected = facts.merge(
+        properties, on="property_id", how="left", suffixes=("", "_right")
+    )
+    pd.testing.assert_frame_equal(result, expected)
+
+
+def test_join_strategies_agree(facts, properties):
+    facts = facts.sort_values("property_id", kind="stable")
+    merged = DataMapper(facts.copy()).join(
+        properties, on="property_id", strategy="merge"
+    )
+    hashed = DataMapper(facts.copy()).join(
+        properties, on="property_id", strategy="hash"
+    )
+    pd.testing.assert_frame_equal(merged.df, hashed.df)
+
+
+def test_join_streams(facts, properties, tmp_path):
+    path = tmp_path / "facts.csv"
+    facts.to_csv(path, index=False)
+
+    def chain(mapper):
+        return mapper.join(properties, on="property_id").filter_columns(
+            ["volume", "basin"]
+        )
+
+    streamed = chain(DataMapper.from_csv(path, chunksize=64)).collect()
+    pd.testing.assert_frame_equal(streamed, chain(DataMapper(path)).df)
+    lazy = chain(DataMapper.from_csv(path, lazy=True))
+    assert "columns=['property_id', 'volume']" in lazy.explain()
+
+
+def test_lazy_join_keeps_clashing_columns(tmp_path):
+    path = tmp_path / "left.csv"
+    pd.DataFrame({"k": [1, 2], "x": [1.0, 2.0], "y": [0, 0]}).to_csv(
+        path, index=False
+    )
+    right = pd.DataFrame({"k": [1, 2], "x": ["a", "b"]})
+
+    def chain(mapper):
+        return mapper.join(right, on="k").filter_columns(["k", "x_right"])
+
+    lazy = chain(DataMapper.from_csv(path, lazy=True))
+    assert "columns=['k', 'x']" in lazy.explain()
+    pd.testing.assert_frame_equal(lazy.collect(), chain(DataMapper(path)).df)
@@ -0,0 +1,404 @@
+import asyncio
+import concurrent.futures
+import pickle
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from wells.ref_data import AsyncLookup
+from wells.ref_data import CachedLookup
+from wells.ref_data import Lookup
+from wells.ref_data import RedisLookup
+from wells.ref_data import SqlLookup
+from wells.ref_data import SqliteLookup
+
+
+def test_get_values(helo_ref):
+    lookup = SqliteLookup(helo_ref)
+    values = lookup.get_values(
+        [("UNLOC", "USSFO"), ("UNLOC", "XXXXX"), ("PRODUCT", "OIL")]
+    )
+    assert values == {
+        ("UNLOC", "USSFO"): "San Francisco",
+        ("PRODUCT", "OIL"): "Crude oil",
+    }
+
+
+def test_get_values_batches(helo_ref, monkeypatch):
+    lookup = SqliteLookup(helo_ref)
+    monkeypatch.setattr(lookup, "BATCH", 2)
+    pairs = [("UNLOC", "USSFO"), ("UNLOC", "USHOU"), ("UNLOC", "GBLON")]
+    assert len(lookup.get_values(pairs)) == 3
+
+
+def test_shared_across_threads(helo_ref):
+    lookup = SqliteLookup(helo_ref)
+    pairs = [("UNLOC", "USSFO"), ("UNLOC", "USHOU"), ("PRODUCT", "OIL")]
+    with concurrent.futures.ThreadPoolExecutor(4) as executor:
+        results = list(executor.map(lookup.get_values, [pairs] * 40))
+    assert all(len(values) == 3 for values in results)
+    assert len({id(con) for con in lookup._connections.values()}) > 1
+    lookup.close()
+    assert lookup.get_values(pairs[:1]) == {pairs[0]: "San Francisco"}
+
+
+def test_pickles_as_path(helo_ref):
+    lookup = pickle.loads(pickle.dumps(SqliteLookup(helo_ref)))
+    assert lookup.get_values([("UNLOC", "GBLON")]) == {
+        ("UNLOC", "GBLON"): "London"
+    }
+
+
+def test_read_only(helo_ref, tmp_path):
+    lookup = SqliteLookup(helo_ref)
+    with pytest.raises(sqlite3.OperationalError):
+        lookup.con.execute("DELETE FROM helo_ref")
+    with pytest.raises(sqlite3.OperationalError):
+        SqliteLookup(tmp_path / "missing.db").con
+    assert not (tmp_path / "missing.db").exists()
+
+
+def test_default_is_shared():
+    assert Lookup.default() is Lookup.default()
+
+
+def test_get_value_is_parameterized(helo_ref):
+    lookup = SqliteLookup(helo_ref)
+    assert lookup.get_value(("UNLOC", "USSFO")) == {
+        ("UNLOC", "USSFO"): ("San Francisco",)
+    }
+    assert lookup.get_value(("UNLOC", "x' OR '1'='1")) == {
+        ("UNLOC", "x' OR '1'='1"): None
+    }
+
+
+def test_index_and_few_queries(helo_ref):
+    lookup = SqliteLookup(helo_ref)
+    con = sqlite3.connect(helo_ref)
+    plan = con.execute(
+        "EXPLAIN QUERY PLAN SELECT value FROM helo_ref "
+        "WHERE type = 'UNLOC' AND code = 'USSFO'"
+    ).fetchall()
+    assert "helo_ref_type_code" in plan[0][-1]
+    con.close()
+    statements = []
+    lookup.con.set_trace_callback(statements.append)
+    pairs = [("UNLOC", f"CODE{i}") for i in range(40_000)]
+    lookup.get_values(pairs + [("UNLOC", "USSFO")])
+    assert len(statements) == 3
+
+
+class DictLookup(Lookup):
+    def __init__(self, values):
+        self.values = values
+        self.calls = []
+
+    def is_valid(self, code):
+        return any(code == c for _, c in self.values)
+
+    def get_code(self, value):
+        return None
+
+    def get_value(self, lookup):
+        return {lookup: self.values.get(lookup)}
+
+    def get_values(self, lookups):
+        lookups = list(lookups)
+        self.calls.append(lookups)
+        return {p: self.values[p] for p in lookups if p in self.values}
+
+
+def test_cached_lookup_counts_and_negative_caching():
+    backend = DictLookup({("UNLOC", "USSFO"): "San Francisco"})
+    cached = backend.cached()
+    pairs = [("UNLOC", "USSFO"), ("UNLOC", "XXXXX")]
+    assert cached.get_values(pairs) == {pairs[0]: "San Francisco"}
+    assert cached.get_values(pairs) == {pairs[0]: "San Francisco"}
+    assert cached.get_value(pairs[1]) == {pairs[1]: None}
+    assert backend.calls == [pairs]
+    stats = cached.stats()
+    assert (stats["hits"], stats["misses"], stats["size"]) == (3, 2, 2)
+
+
+def test_cached_lookup_evicts_least_recently_used():
+    backend = DictLookup({("T", str(i)): i for i in range(5)})
+    cached = CachedLookup(backend, maxsize=2)
+    cached.get_values([("T", "0"), ("T", "1")])
+    cached.get_values([("T", "0")])
+    cached.get_values([("T", "2")])
+    assert cached.evictions == 1
+    cached.get_values([("T", "0"), ("T", "1")])
+    assert backend.calls[-1] == [("T", "1")]
+
+
+def test_cached_lookup_expires(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    backend = DictLookup({("T", "A"): 1})
+    cached = CachedLookup(backend, ttl=10, negative_ttl=1)
+    cached.get_values([("T", "A"), ("T", "B")])
+    now[0] += 5
+    cached.get_values([("T", "A"), ("T", "B")])
+    assert backend.calls[-1] == [("T", "B")]
+    now[0] += 6
+    cached.get_values([("T", "A")])
+    assert backend.calls[-1] == [("T", "A")]
+
+
+def test_cached_lookup_coalesces_concurrent_misses():
+    started, release = threading.Event(), threading.Event()
+
+    class SlowLookup(DictLookup):
+        def get_values(self, lookups):
+            started.set()
+            release.wait(5)
+            return super().get_values(lookups)
+
+    backend = SlowLookup({("T", "A"): 1})
+    cached = backend.cached()
+    with concurrent.futures.ThreadPoolExecutor(4) as executor:
+        first = executor.submit(cached.get_values, [("T", "A")])
+        started.wait(5)
+        others = [
+            executor.submit(cached.get_values, [("T", "A")]) for _ in range(3)
+        ]
+        time.sleep(0.05)
+        release.set()
+        results = [f.result() for f in [first] + others]
+    assert results == [{("T", "A"): 1}] * 4
+    assert len(backend.calls) == 1
+
+
+def test_cached_lookup_does_not_cache_errors():
+    class FailingLookup(DictLookup):
+        def get_values(self, lookups):
+            super().get_values(lookups)
+            if len(self.calls) == 1:
+                raise sqlite3.OperationalError("database is locked")
+            return {}
+
+    cached = FailingLookup({}).cached()
+    with pytest.raises(sqlite3.OperationalError):
+        cached.get_values([("T", "A")])
+    assert cached.get_values([("T", "A")]) == {}
+    assert len(cached) == 1
+
+
+def test_cached_sqlite_lookup(helo_ref):
+    cached = SqliteLookup(helo_ref).cached(maxsize=10)
+    cached = pickle.loads(pickle.dumps(cached))
+    assert cached.get_values([("PRODUCT", "OIL")]) == {
+        ("PRODUCT", "OIL"): "Crude oil"
+    }
+    assert cached.is_valid("OIL") is cached.is_valid("OIL")
+
+
+def test_async_lookup_batches_concurrent_awaits():
+    backend = DictLookup({("T", str(i)): i for i in range(50)})
+    lookup = AsyncLookup(backend)
+
+    async def main():
+        singles = [lookup.get_value(("T", str(i % 60))) for i in range(120)]
+        many = lookup.get_values([("T", "1"), ("T", "99")])
+        return await asyncio.gather(*singles, many)
+
+    *singles, many = asyncio.run(main())
+    assert singles[3] == {("T", "3"): 3}
+    assert singles[55] == {("T", "55"): None}
+    assert many == {("T", "1"): 1}
+    assert len(backend.calls) == 1
+    assert len(backend.calls[0]) == 61
+    assert (lookup.requests, lookup.batches) == (122, 1)
+
+
+def test_async_lookup_window_and_max_batch():
+    backend = DictLookup({("T", "A"): 1, ("T", "B"): 2})
+
+    async def staggered(lookup):
+        first = asyncio.ensure_future(lookup.get_value(("T", "A")))
+        await asyncio.sleep(0.001)
+        second = await lookup.get_value(("T", "B"))
+        return await first, second
+
+    assert asyncio.run(staggered(AsyncLookup(backend, window=0.05))) == (
+        {("T", "A"): 1},
+        {("T", "B"): 2},
+    )
+    assert len(backend.calls) == 1
+    lookup = AsyncLookup(backend, max_batch=1)
+    asyncio.run(lookup.get_values([("T", "A"), ("T", "B")]))
+    assert lookup.batches == 2
+
+
+def test_async_lookup_errors_and_cancellation():
+    class FailingLookup(DictLookup):
+        def get_values(self, lookups):
+            raise sqlite3.OperationalError("database is locked")
+
+    async def failing():
+        lookup = AsyncLookup(FailingLookup({}))
+        return await asyncio.gather(
+            lookup.get_value(("T", "A")),
+            lookup.get_value(("T", "A")),
+            return_exceptions=True,
+        )
+
+    errors = asyncio.run(failing())
+    assert all(isinstance(e, sqlite3.OperationalError) for e in errors)
+
+    async def cancelled():
+        lookup = AsyncLookup(DictLookup({("T", "A"): 1}), window=0.01)
+        first = asyncio.ensure_future(lookup.get_value(("T", "A")))
+        second = asyncio.ensure_future(lookup.get_value(("T", "A")))
+        await asyncio.sleep(0)
+        first.cancel()
+        return await second
+
+    assert asyncio.run(cancelled()) == {("T", "A"): 1}
+
+
+def test_async_lookup_over_sqlite(helo_ref):
+    lookup = AsyncLookup(SqliteLookup(helo_ref))
+
+    async def main():
+        return await asyncio.gather(
+            lookup.get_value(("UNLOC", "USSFO")),
+            lookup.get_values([("PRODUCT", "OIL"), ("UNLOC", "GBLON")]),
+            lookup.is_valid("USSFO"),
+        )
+
+    value, values, valid = asyncio.run(main())
+    assert value == {("UNLOC", "USSFO"): "San Francisco"}
+    assert values == {
+        ("PRODUCT", "OIL"): "Crude oil",
+        ("UNLOC", "GBLON"): "London",
+    }
+    assert valid
+    assert lookup.batches == 2
+
+
+class FakeRedis:
+    """The part of the redis-py client RedisLookup uses, in memory."""
+
+    def __init__(self):
+        self.data = {}
+        self.round_trips = 0
+
+    def get(self, key):
+        self.round_trips += 1
+        return self.data.get(key)
+
+    def exists(self, key):
+        self.round_trips += 1
+        return int(key in self.data)
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, client):
+        self.client = client
+        self.commands = []
+
+    def mget(self, keys):
+        self.commands.append(lambda: [self.client.data.get(k) for k in keys])
+
+    def mset(self, mapping):
+        def mset():
+            for key, value in mapping.items():
+                self.client.data[key] = str(value).encode()
+            return True
+
+        self.commands.append(mset)
+
+    def execute(self):
+        self.client.round_trips += 1
+        commands, self.commands = self.commands, []
+        return [command() for command in commands]
+
+
+def test_redis_lookup(helo_ref, monkeypatch):
+    client = FakeRedis()
+    lookup = RedisLookup(client=client)
+    assert lookup.load(helo_ref, codes=True) == 4
+    monkeypatch.setattr(lookup, "BATCH", 2)
+    client.round_trips = 0
+    pairs = [("UNLOC", "USSFO"), ("UNLOC", "XXXXX"), ("PRODUCT", "OIL")]
+    assert lookup.get_values(pairs + pairs) == {
+        ("UNLOC", "USSFO"): "San Francisco",
+        ("PRODUCT", "OIL"): "Crude oil",
+    }
+    assert client.round_trips == 1
+    assert lookup.get_value(("UNLOC", "GBLON")) == {
+        ("UNLOC", "GBLON"): "London"
+    }
+    assert lookup.is_valid(("UNLOC", "USHOU"))
+    assert not lookup.is_valid(("UNLOC", "XXXXX"))
+    assert lookup.get_code("Houston") == ("UNLOC", "USHOU")
+    assert lookup.get_code("Atlantis") is None
+
+
+def test_redis_lookup_writes_in_batches(monkeypatch):
+    client = FakeRedis()
+    lookup = RedisLookup(client=client)
+    monkeypatch.setattr(lookup, "WRITE_BATCH", 10)
+    monkeypatch.setattr(lookup, "BATCH", 30)
+    rows = [("T", str(i), f"value {i}") for i in range(95)]
+    assert lookup.write(rows + [("T", "none", None)]) == 95
+    assert client.round_trips == 4
+    assert len(client.data) == 95
+    assert lookup.get_values([("T", "94")]) == {("T", "94"): "value 94"}
+
+
+def test_redis_lookup_needs_redis(monkeypatch):
+    from wells import ref_data
+
+    monkeypatch.setattr(ref_data, "redis", None)
+    with pytest.raises(ImportError, match="wells\\[redis\\]"):
+        RedisLookup()
+
+
+def test_redis_lookup_with_fakeredis(helo_ref):
+    fakeredis = pytest.importorskip("fakeredis")
+    lookup = RedisLookup(client=fakeredis.FakeRedis())
+    lookup.load(helo_ref)
+    assert lookup.get_values([("PRODUCT", "OIL")]) == {
+        ("PRODUCT", "OIL"): "Crude oil"
+    }
+
+
+def test_sql_lookup(helo_ref, monkeypatch):
+    lookup = Lookup.mysql(f"sqlite:///{helo_ref}")
+    pairs = [("UNLOC", "USSFO"), ("UNLOC", "XXXXX"), ("PRODUCT", "OIL")]
+    assert lookup.get_values(pairs) == SqliteLookup(helo_ref).get_values(pairs)
+    assert lookup.stats()["queries"] == 2
+    monkeypatch.setattr(lookup, "BATCH", 1)
+    lookup.get_values(pairs)
+    assert lookup.stats()["queries"] == 5
+    assert lookup.get_value(("UNLOC", "GBLON")) == {
+        ("UNLOC", "GBLON"): "London"
+    }
+    assert lookup.is_valid(("UNLOC", "USHOU"))
+    assert not lookup.is_valid(("UNLOC", "XXXXX"))
+    assert lookup.get_code("Crude oil") == ("PRODUCT", "OIL")
+    assert lookup.get_code("Atlantis") is None
+    assert len(list(lookup.items(batch=2))) == 4
+    stats = lookup.stats()
+    assert stats["queries"] == 11
+    assert stats["max_ms"] >= stats["mean_ms"] > 0
+    assert stats["pool"]["checkedout"] == 0
+
+
+def test_sql_lookup_threads_and_pickle(helo_ref):
+    lookup = SqlLookup(helo_ref, pool_size=2)
+    pairs = [("UNLOC", "USSFO"), ("PRODUCT", "OIL")]
+    with concurrent.futures.ThreadPoolExecutor(4) as executor:
+        results = list(executor.map(lookup.get_values, [pairs] * 20))
+    assert all(len(values) == 2 for values in results)
+    copy = pickle.loads(pickle.dumps(lookup))
+    assert copy.engine_kwargs == {"pool_size": 2}
+    assert copy.get_values(pairs[:1]) == {pairs[0]: "San Francisco"}
+    lookup.close()
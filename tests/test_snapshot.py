@@ -0,0 +1,91 @@
+import os
+import pickle
+import sqlite3
+
+import pytest
+
+from wells import snapshot
+from wells.ref_data import Lookup
+from wells.ref_data import SnapshotLookup
+from wells.ref_data import SqliteLookup
+
+
+def test_write_and_read(tmp_path):
+    path = tmp_path / "ref.snapshot"
+    rows = [
+        ("UNLOC", "USSFO", "San Francisco"),
+        ("UNLOC", "USSFO", "duplicate"),
+        ("PRODUCT", "OIL", "Crude oil"),
+        ("PRODUCT", "GAS", None),
+        ("UNLOC", "ZZZZZ", "Zürich"),
+    ]
+    snapshot.write(rows, path, stamp=42)
+    opened = snapshot.Snapshot(path)
+    assert len(opened) == 3
+    assert opened.stamp == snapshot.read_stamp(path) == 42
+    assert opened.get("UNLOC", "USSFO") == "San Francisco"
+    assert opened.get("UNLOC", "ZZZZZ") == "Zürich"
+    assert opened.get("PRODUCT", "GAS") is None
+    assert opened.get("UNLOC", "a much longer code than any key") is None
+    pairs = [("PRODUCT", "OIL"), ("UNLOC", "NOPE"), ("UNLOC", "USSFO")]
+    assert opened.get_many(pairs) == {
+        ("PRODUCT", "OIL"): "Crude oil",
+        ("UNLOC", "USSFO"): "San Francisco",
+    }
+    assert dict(opened.items())[("UNLOC", "ZZZZZ")] == "Zürich"
+
+
+def test_empty_snapshot(tmp_path):
+    path = tmp_path / "empty.snapshot"
+    snapshot.write([], path)
+    opened = snapshot.Snapshot(path)
+    assert len(opened) == 0
+    assert opened.get_many([("UNLOC", "USSFO")]) == {}
+    assert opened.get("UNLOC", "USSFO") is None
+
+
+def test_not_a_snapshot(tmp_path):
+    path = tmp_path / "other.bin"
+    path.write_bytes(b"not a snapshot at all, just some bytes")
+    assert snapshot.read_stamp(path) is None
+    with pytest.raises(ValueError):
+        snapshot.Snapshot(path)
+
+
+def test_snapshot_lookup_matches_sqlite(helo_ref):
+    lookup = Lookup.snapshot(helo_ref)
+    assert os.path.exists(f"{helo_ref}.snapshot")
+    pairs = [("UNLOC", "USSFO"), ("UNLOC", "XXXXX"), ("PRODUCT", "OIL")]
+    assert lookup.get_values(pairs) == SqliteLookup(helo_ref).get_values(pairs)
+    assert lookup.get_value(("UNLOC", "GBLON")) == {
+        ("UNLOC", "GBLON"): "London"
+    }
+    assert lookup.is_valid(("PRODUCT", "OIL"))
+    assert lookup.get_code("Houston") == ("UNLOC", "USHOU")
+    copy = pickle.loads(pickle.dumps(lookup))
+    assert copy.get_values(pairs[:1]) == {pairs[0]: "San Francisco"}
+
+
+def test_snapshot_lookup_reloads(helo_ref):
+    lookup = Lookup.snapshot(helo_ref)
+    lookup.check_interval = 0
+    before = lookup.snapshot
+    con = sqlite3.connect(helo_ref)
+    con.execute("INSERT INTO helo_ref VALUES ('UNLOC', 'NLRTM', 'Rotterdam')")
+    con.commit()
+    con.close()
+    assert lookup.get_values([("UNLOC", "NLRTM")]) == {
+        ("UNLOC", "NLRTM"): "Rotterdam"
+    }
+    assert lookup.snapshot is not before
+    # the old snapshot stays readable for anyone still holding it
+    assert before.get("UNLOC", "NLRTM") is None
+    assert before.get("UNLOC", "USSFO") == "San Francisco"
+
+
+def test_snapshot_lookup_picks_up_replaced_file(tmp_path):
+    path = tmp_path / "ref.snapshot"
+    snapshot.write([("UNLOC", "USSFO", "San Francisco")], path)
+    lookup = SnapshotLookup(path, check_interval=0)
+    snapshot.write([("UNLOC", "USSFO", "SFO")], path)
+    assert lookup.get_value(("UNLOC", "USSFO")) == {("UNLOC", "USSFO"): "SFO"}
@@ -0,0 +1,89 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from wells import spill
+from wells.dsl import DataMapper
+
+
+@pytest.fixture
+def production(tmp_path):
+    rng = np.random.default_rng(1)
+    rows = 5000
+    df = pd.DataFrame(
+        {
+            "well": rng.integers(0, 300, rows),
+            "basin": rng.choice(list("abcde"), rows),
+            "volume": rng.random(rows).round(3),
+            "month": np.arange(rows),
+        }
+    )
+    path = tmp_path / "production.csv"
+    df.to_csv(path, index=False)
+    return path
+
+
+@pytest.fixture
+def spills(monkeypatch):
+    written = []
+    write = spill.SpillFile.write
+
+    def counting(self, dataframe):
+        written.append(len(dataframe))
+        write(self, dataframe)
+
+    monkeypatch.setattr(spill.SpillFile, "write", counting)
+    # several blocks per run, so the merge has to refill them
+    monkeypatch.setattr(spill, "MIN_BLOCK", 100)
+    return written
+
+
+@pytest.mark.parametrize(
+    "chain",
+    [
+        lambda m: m.sort_rows(by=["basin", "well"], ascending=[False, True]),
+        lambda m: m.filter_rows("volume > 0.5").sort_rows(by="volume"),
+        lambda m: m.group_by(["basin", "well"], {"volume": "sum"}),
+        lambda m: m.group_by("well", {"volume": "mean", "month": "max"}),
+        lambda m: m.group_by("well", {"volume": "median"}).sort_rows(
+            by="volume"
+        ),
+    ],
+)
+def test_spilled_matches_in_memory(production, spills, chain):
+    spilled = DataMapper.from_csv(
+        production, memory_limit=5_000, chunksize=500
+    )
+    expected = chain(DataMapper.from_csv(production)).df
+    pd.testing.assert_frame_equal(chain(spilled).collect(), expected)
+    assert spills
+
+
+def test_within_limit_stays_in_memory(production, spills):
+    mapper = DataMapper.from_csv(production, memory_limit=10**9)
+    assert mapper.chunksize is not None
+    mapper.sort_rows(by="well").group_by("well", "sum").collect()
+    assert not spills
+
+
+def test_merge_sorted_runs():
+    rng = np.random.default_rng(2)
+    frames = []
+    for run, rows in enumerate([400, 0, 1500, 900]):
+        frame = pd.DataFrame(
+            {
+                "basin": rng.choice(list("abc"), rows),
+                "volume": rng.choice([0.5, 1.5, np.nan], rows),
+                "run": run,
+            }
+        )
+        frames.append(
+            frame.sort_values(
+                ["basin", "volume"], ascending=[False, True], kind="stable"
+            )
+        )
+    merged = spill.merge(frames, ["basin", "volume"], [False, True])
+    expected = pd.concat(frames).sort_values(
+        ["basin", "volume"], ascending=[False, True], kind="stable"
+    )
+    pd.testing.assert_frame_equal(merged, expected)